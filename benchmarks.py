@@ -1,10 +1,21 @@
+import io
+import sys
+import os
 import time
+import zipfile
+import subprocess
+import tracemalloc
+import xml.parsers.expat
 import opustools
 import cProfile
 
 print(opustools.__path__)
 
 from opustools import OpusRead
+from opustools.parse.block_parser import BlockParser
+from opustools.parse.alignment_parser import AlignmentParser
+from opustools.util import file_open, OutputSink, ReadAheadReader
+from opustools.formatting import sentence_format_type, out_put_type
 
 def printResults(**arguments):
     avg_time = 0
@@ -19,6 +30,186 @@ def printResults(**arguments):
         print("%.4f" % float(total_time), "s")
     print("%.4f" % (avg_time/3), 's')
 
+def printParseResults(zip_name, chunk_size=None, parser_class=BlockParser):
+    avg_time = 0
+    with zipfile.ZipFile(zip_name) as zf:
+        names = [n for n in zf.namelist() if n.endswith('.xml')]
+        for i in range(3):
+            start = time.time()
+            for name in names:
+                bp = parser_class(zf.open(name), data_tag='w',
+                        chunk_size=chunk_size)
+                blocks = bp.get_complete_blocks()
+                while blocks:
+                    blocks = bp.get_complete_blocks()
+                bp.close_document()
+            end = time.time()
+            total_time = end-start
+            avg_time += total_time
+            print("%.4f" % float(total_time), "s")
+    print("%.4f" % (avg_time/3), 's')
+
+class DictBlock:
+
+    def __init__(self, parent=None, name=None, data='', attributes=None):
+        """Block with an instance __dict__, like the Block class before
+        __slots__ were added"""
+        self.parent = parent
+        self.name = name
+        self.data = data
+        self.attributes = attributes
+
+class DictBlockParser(BlockParser):
+
+    def __init__(self, document, data_tag=None, chunk_size=None):
+        """BlockParser with the handlers used before __slots__ were
+        added: a DictBlock per element, character data grown with +=
+        and tag names that are not interned"""
+        super().__init__(document, data_tag=data_tag, chunk_size=chunk_size)
+        self.block = DictBlock(name='root')
+
+        def start_element(name, attrs):
+            self.block = DictBlock(parent=self.block, name=name,
+                    attributes=attrs)
+
+        def end_element(name):
+            self.completeBlocks.append(self.block)
+            self.block = self.block.parent
+
+        def char_data(data):
+            if self.block.name == self.data_tag:
+                self.block.data += data
+
+        self.handlers = (start_element, end_element,
+                char_data if data_tag else None)
+        self.p = xml.parsers.expat.ParserCreate()
+        self.set_handlers(self.handlers)
+
+def printBlockResults(zip_name, parser_class):
+    tracemalloc.start()
+    printParseResults(zip_name, chunk_size=1024*1024,
+            parser_class=parser_class)
+    print("Peak memory: %.1f MiB" % (tracemalloc.get_traced_memory()[1]/2**20))
+    tracemalloc.stop()
+
+def collectBlockLinks(alignment_name):
+    """Collect links like AlignmentParser did before it used the
+    LinkParser: a Block per link and xtargets split for every link"""
+    bp = BlockParser(file_open(alignment_name), chunk_size=1024*1024)
+    links = 0
+    attrs = []
+    src_id_set, trg_id_set = set(), set()
+    blocks = bp.get_complete_blocks()
+    while blocks:
+        for block in blocks:
+            if block.name == 'link':
+                ids = block.attributes['xtargets'].split(';')
+                s_id = ids[0].split()
+                t_id = ids[1].split()
+                attrs.append(block.attributes)
+                src_id_set.update(s_id)
+                trg_id_set.update(t_id)
+            elif block.name == 'linkGrp':
+                links += len(attrs)
+                attrs = []
+                src_id_set, trg_id_set = set(), set()
+        blocks = bp.get_complete_blocks()
+    bp.close_document()
+    return links
+
+def collectRecordLinks(alignment_name):
+    ap = AlignmentParser(file_open(alignment_name))
+    links = 0
+    records, src_set, trg_set, src_doc, trg_doc = ap.collect_link_records()
+    while src_doc:
+        links += len(records)
+        records, src_set, trg_set, src_doc, trg_doc = ap.collect_link_records()
+    ap.bp.close_document()
+    return links
+
+def collectReadAheadLinks(alignment_name):
+    """Collect link records from bytes decompressed in a background
+    thread"""
+    ap = AlignmentParser(ReadAheadReader(alignment_name))
+    links = 0
+    records, src_set, trg_set, src_doc, trg_doc = ap.collect_link_records()
+    while src_doc:
+        links += len(records)
+        records, src_set, trg_set, src_doc, trg_doc = ap.collect_link_records()
+    ap.bp.close_document()
+    return links
+
+def printLinkResults(alignment_name, collect):
+    avg_time = 0
+    for i in range(3):
+        start = time.time()
+        collect(alignment_name)
+        end = time.time()
+        total_time = end-start
+        avg_time += total_time
+        print("%.4f" % float(total_time), "s")
+    print("%.4f" % (avg_time/3), 's')
+
+def printPipeResults(*arguments):
+    """Run opus_read with output to a pipe and measure the throughput"""
+    avg_time = 0
+    opus_read = os.path.join(opustools.__path__[0], '..', 'bin', 'opus_read')
+    for i in range(3):
+        start = time.time()
+        process = subprocess.Popen([sys.executable, opus_read]+list(arguments),
+                stdout=subprocess.PIPE)
+        total_bytes = 0
+        chunk = process.stdout.read(1024*1024)
+        while chunk:
+            total_bytes += len(chunk)
+            chunk = process.stdout.read(1024*1024)
+        process.wait()
+        end = time.time()
+        total_time = end-start
+        avg_time += total_time
+        print("%.4f" % float(total_time), "s", "%.1f" % (
+            total_bytes/2**20/total_time), "MiB/s")
+    print("%.4f" % (avg_time/3), 's')
+
+def concatNormalFormat(src_sentences, src_ids, trg_sentences, trg_ids):
+    """Format a sentence pair in normal mode like the formatters did
+    before they used templates: the result is grown with +="""
+    src_result = '\n================================'
+    for i, sentence in enumerate(src_sentences):
+        src_result += ('\n(src)="'+src_ids[i]+'">'+sentence)
+    trg_result = ''
+    for i, sentence in enumerate(trg_sentences):
+        trg_result += ('\n(trg)="'+trg_ids[i]+'">'+sentence)
+    return src_result, trg_result
+
+def printFormatResults(write_mode, sentences_per_side, pairs=100000,
+        concat=False):
+    """Format and write many-to-many sentence pairs to memory"""
+    ids = ['s{}'.format(i) for i in range(sentences_per_side)]
+    sentences = ['Word ' * 20 + str(i) for i in range(sentences_per_side)]
+    link_a = {'xtargets': ' '.join(ids)+';'+' '.join(ids)}
+    format_src, format_trg = sentence_format_type(write_mode, ['en', 'fi'])
+    out_put = out_put_type(write_mode, None, False, False, None, '\t')
+    avg_time = 0
+    for i in range(3):
+        sink = OutputSink(io.StringIO())
+        start = time.time()
+        for j in range(pairs):
+            if concat:
+                src_result, trg_result = concatNormalFormat(
+                        sentences, ids, sentences, ids)
+            else:
+                src_result = format_src(sentences, ids)
+                trg_result = format_trg(sentences, ids)
+            out_put(src_result, trg_result, sink, None, None, link_a, None,
+                    None, None)
+        sink.flush()
+        end = time.time()
+        total_time = end-start
+        avg_time += total_time
+        print("%.4f" % float(total_time), "s")
+    print("%.4f" % (avg_time/3), 's')
+
 print("Corpus: Books, 3654 alignment pairs, source: en, target: fi, all alignments ")
 print("Exhaustive parser:")
 printResults(directory='Books', source='en', target='fi', write=['books_en_fi'], write_mode='moses')
@@ -64,3 +255,38 @@ printResults(directory='Tatoeba', source='br', target='en', write=['tatoeba_br_e
 
 print("Corpus: Tatoeba, 383 alignment pairs, source: br, target: en, all alignments, preprocessing xml")
 printResults(directory='Tatoeba', source='br', target='en', write=['tatoeba_br_en'], write_mode='moses')
+
+print("Corpus: Europarl, all en documents, BlockParser only")
+print("Line by line:")
+printParseResults('Europarl_v7_xml_en.zip')
+print("Chunks of 1 MiB:")
+printParseResults('Europarl_v7_xml_en.zip', chunk_size=1024*1024)
+
+print("Corpus: Books, all en documents, preprocessing parsed, BlockParser only")
+print("Block with __dict__:")
+printBlockResults('Books_latest_parsed_en.zip', DictBlockParser)
+print("Block with __slots__:")
+printBlockResults('Books_latest_parsed_en.zip', BlockParser)
+
+print("Corpus: Europarl, 1974717 alignment pairs, source: en, target: fi, links only")
+print("Blocks:")
+printLinkResults('Europarl_v7_xml_en-fi.xml.gz', collectBlockLinks)
+print("Link records:")
+printLinkResults('Europarl_v7_xml_en-fi.xml.gz', collectRecordLinks)
+print("Link records, read-ahead decompression:")
+printLinkResults('Europarl_v7_xml_en-fi.xml.gz', collectReadAheadLinks)
+
+print("Corpus: Europarl, 1974717 alignment pairs, source: en, target: fi, all alignments, preprocessing raw, moses output to a pipe")
+printPipeResults('-d', 'Europarl', '-s', 'en', '-t', 'fi', '-r', 'v7', '-p', 'raw', '-wm', 'moses')
+
+print("Synthetic 1-to-1 alignments, 100000 pairs, normal output to memory")
+print("Concatenation:")
+printFormatResults('normal', 1, concat=True)
+print("Parts joined once:")
+printFormatResults('normal', 1)
+
+print("Synthetic 8-to-8 alignments, 100000 pairs, normal output to memory")
+print("Concatenation:")
+printFormatResults('normal', 8, concat=True)
+print("Parts joined once:")
+printFormatResults('normal', 8)
@@ -0,0 +1,95 @@
+import os
+import json
+import time
+
+class CheckpointError(Exception):
+
+    def __init__(self, message):
+        """Raise error when a run cannot be resumed from a checkpoint.
+
+        Arguments:
+        message -- Error message to be printed
+        """
+        self.message = message
+
+class Checkpoint:
+
+    def __init__(self, file_name, interval=60, parameters=None):
+        """Record the progress of an OpusRead run in a json file.
+
+        The checkpoint contains the number of the next linkGrp to read,
+        the number of sentence pairs written so far, the size of each
+        output file at that point and the parameters of the run. A run
+        can be resumed only with the same parameters.
+
+        Positional arguments:
+        file_name -- Path of the checkpoint file
+
+        Keyword arguments:
+        interval -- Minimum number of seconds between saves (default 60)
+        parameters -- Dictionary of the arguments that select and format
+            the output
+        """
+        self.file_name = file_name
+        self.interval = interval
+        #Stored as they are read back from the json file
+        self.parameters = json.loads(json.dumps(parameters or {}))
+        self.last_save = time.monotonic()
+
+    def load(self):
+        """Return the saved state, or None if there is no checkpoint.
+        Raise CheckpointError if the checkpoint was saved with different
+        parameters."""
+        try:
+            with open(self.file_name, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            raise CheckpointError('Checkpoint file "{}" cannot be read: '
+                '{}'.format(self.file_name, e))
+        saved = state.get('parameters', {})
+        changed = sorted(name for name in set(saved) | set(self.parameters)
+                if saved.get(name) != self.parameters.get(name))
+        if changed:
+            raise CheckpointError('Checkpoint "{}" was saved with different '
+                'arguments: {}'.format(self.file_name, ', '.join(changed)))
+        return state
+
+    def restore_outputs(self, state, file_names):
+        """Truncate the output files to their sizes in the checkpoint"""
+        outputs = state['outputs']
+        for name in file_names:
+            if name not in outputs:
+                raise CheckpointError('Output file "{}" is not in the '
+                    'checkpoint "{}"'.format(name, self.file_name))
+            if not os.path.isfile(name):
+                raise CheckpointError('Output file "{}" of the checkpoint '
+                    '"{}" is missing'.format(name, self.file_name))
+            os.truncate(name, outputs[name])
+
+    def is_due(self):
+        return time.monotonic() - self.last_save >= self.interval
+
+    def save(self, doc_pair, total, outputs):
+        """Write the output files to disk and save the checkpoint.
+
+        Positional arguments:
+        doc_pair -- Number of the next linkGrp to read
+        total -- Number of sentence pairs written
+        outputs -- List of (file name, OutputSink) pairs
+        """
+        state = {'doc_pair': doc_pair, 'total': total,
+            'outputs': {name: sink.sync() for name, sink in outputs},
+            'parameters': self.parameters}
+        temp_name = '{}.{}.tmp'.format(self.file_name, os.getpid())
+        try:
+            with open(temp_name, 'w', encoding='utf-8') as f:
+                json.dump(state, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_name, self.file_name)
+        finally:
+            if os.path.isfile(temp_name):
+                os.remove(temp_name)
+        self.last_save = time.monotonic()
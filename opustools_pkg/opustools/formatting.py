@@ -1,6 +1,6 @@
 import html
 
-def file_header_type(wmode, write, source_lang):
+def file_header_type(wmode, source_lang):
     """Select function for adding file header"""
 
     tmxheader = ('<?xml version="1.0" encoding="utf-8"?>\n<tmx '
@@ -11,27 +11,17 @@ def file_header_type(wmode, write, source_lang):
         '<!DOCTYPE cesAlign PUBLIC "-//CES//DTD XML cesAlign//EN" "">\n'
         '<cesAlign version="1.0">\n')
 
-    def tmx_write(resultfile):
+    def tmx(resultfile):
         resultfile.write(tmxheader)
-    def tmx_print(resultfile):
-        print(tmxheader, end='')
-    def link_write(resultfile):
+    def link(resultfile):
         resultfile.write(linkheader)
-    def link_print(resultfile):
-        print(linkheader, end='')
     def nothing(resultfile):
         pass
 
-    if write:
-        if wmode == 'tmx':
-            return tmx_write
-        if wmode == 'links':
-            return link_write
-    else:
-        if wmode == 'tmx':
-            return tmx_print
-        if wmode == 'links':
-            return link_print
+    if wmode == 'tmx':
+        return tmx
+    if wmode == 'links':
+        return link
     return nothing
 
 def doc_name_type(wmode, write, print_file_names):
@@ -42,95 +32,63 @@ def doc_name_type(wmode, write, print_file_names):
     link_temp = ' <linkGrp targType="s" fromDoc="{}" toDoc="{}">\n'
 
     #args = (src_doc_name, trg_doc_name, resultfile, mosessrc, mosestrg)
-    def normal_write(*args):
+    def normal(*args):
         args[2].write(normal_temp.format(args[0], args[1]))
-    def normal_print(*args):
-        print(normal_temp.format(args[0], args[1]), end='')
-    def moses_write(*args):
+    def moses(*args):
         args[2].write(moses_temp.format(args[0], args[1]))
-    def moses_write_2(*args):
+    def moses_2(*args):
         args[3].write('\n<fromDoc>{}</fromDoc>\n\n'.format(args[0]))
         args[4].write('\n<toDoc>{}</toDoc>\n\n'.format(args[1]))
-    def moses_print(*args):
-        print(moses_temp.format(args[0], args[1]), end='')
-    def links_write(*args):
+    def links(*args):
         args[2].write(link_temp.format(args[0], args[1]))
-    def links_print(*args):
-        print(link_temp.format(args[0], args[1]), end='')
     def nothing(*args):
         pass
 
-    if wmode == 'normal' and write:
-        return normal_write
-    if wmode == 'normal' and not write:
-        return normal_print
-    if wmode == 'moses' and print_file_names and not write:
-        return moses_print
-    if wmode == 'moses' and print_file_names and len(write) == 1:
-        return moses_write
-    if wmode == 'moses' and print_file_names and len(write) == 2:
-        return moses_write_2
-    if wmode == 'links'and write:
-        return links_write
-    if wmode == 'links'and not write:
-        return links_print
+    if wmode == 'normal':
+        return normal
+    if wmode == 'moses' and print_file_names:
+        if write and len(write) == 2:
+            return moses_2
+        return moses
+    if wmode == 'links':
+        return links
     return nothing
 
-def doc_ending_type(wmode, write):
+def doc_ending_type(wmode):
     """Select function for adding document ending"""
 
     linkend = ' </linkGrp>\n'
     normalend = '\n================================\n'
 
-    def normal_write(resultfile):
+    def normal(resultfile):
         resultfile.write(normalend)
-    def normal_print(resultfile):
-        print(normalend, end='')
-    def link_write(resultfile):
+    def link(resultfile):
         resultfile.write(linkend)
-    def link_print(resultfile):
-        print(linkend, end='')
     def nothing(resultfile):
         pass
 
-    if write:
-        if wmode == 'normal':
-            return normal_write
-        if wmode == 'links':
-            return link_write
-    else:
-        if wmode == 'normal':
-            return normal_print
-        if wmode == 'links':
-            return link_print
+    if wmode == 'normal':
+        return normal
+    if wmode == 'links':
+        return link
     return nothing
 
-def file_ending_type(wmode, write):
+def file_ending_type(wmode):
     """Select function for adding file ending"""
     tmxend = '\t</body>\n</tmx>\n'
     linkend = '</cesAlign>\n'
 
-    def tmx_write(resultfile):
+    def tmx(resultfile):
         resultfile.write(tmxend)
-    def tmx_print(resultfile):
-        print(tmxend, end='')
-    def link_write(resultfile):
+    def link(resultfile):
         resultfile.write(linkend)
-    def link_print(resultfile):
-        print(linkend, end='')
     def nothing(resultfile):
         pass
 
-    if write:
-        if wmode == 'tmx':
-            return tmx_write
-        if wmode == 'links':
-            return link_write
-    else:
-        if wmode == 'tmx':
-            return tmx_print
-        if wmode == 'links':
-            return link_print
+    if wmode == 'tmx':
+        return tmx
+    if wmode == 'links':
+        return link
     return nothing
 
 
@@ -182,126 +140,93 @@ def write_id_line_type(switch_langs, attribute):
 def out_put_type(wmode, write, write_ids, switch_langs, attribute, moses_del):
     """Select function for outputting sentence pairs"""
 
+    attr_temp = '{}="{}"'
+
     #args = (src_result, trg_result, resultfile, mosessrc, mosestrg, link_a,
     #       id_file, src_doc_name, trg_doc_name)
-    def normal_write(*args):
-        args[2].write(args[0]+args[1])
-    def normal_print(*args):
-        print(args[0]+args[1], end='')
-    def moses_write(*args):
-        args[2].write(args[0][:-1]+moses_del+args[1])
-    def moses_write_2(*args):
-        args[3].write(args[0])
-        args[4].write(args[1])
-    def moses_print(*args):
-        print(args[0][:-1]+moses_del+args[1], end='')
-    def links_write(*args):
-        str_link = '<link {} />\n'.format(' '.join(
-            ['{}="{}"'.format(k, v) for k, v in args[5].items()]))
-        args[2].write(str_link)
-    def links_print(*args):
-        str_link = '<link {} />\n'.format(' '.join(
-            ['{}="{}"'.format(k, v) for k, v in args[5].items()]))
-        print(str_link, end='')
+    def normal(*args):
+        args[2].writelines((args[0], args[1]))
+    def moses(*args):
+        args[2].writelines((args[0], moses_del, args[1], '\n'))
+    def moses_2(*args):
+        args[3].writelines((args[0], '\n'))
+        args[4].writelines((args[1], '\n'))
+    def links(*args):
+        args[2].writelines(('<link ', ' '.join(
+            [attr_temp.format(k, v) for k, v in args[5].items()]), ' />\n'))
 
     write_id_line = write_id_line_type(switch_langs, attribute)
 
-    def normal_write_id(*args):
-        args[2].write(args[0]+args[1])
-        write_id_line(args[5], args[6], args[7], args[8])
-    def normal_print_id(*args):
-        print(args[0]+args[1], end='')
-        write_id_line(args[5], args[6], args[7], args[8])
-    def moses_write_id(*args):
-        args[2].write(args[0][:-1]+'\t'+args[1])
+    def normal_id(*args):
+        normal(*args)
         write_id_line(args[5], args[6], args[7], args[8])
-    def moses_write_2_id(*args):
-        args[3].write(args[0])
-        args[4].write(args[1])
+    def moses_id(*args):
+        args[2].writelines((args[0], '\t', args[1], '\n'))
         write_id_line(args[5], args[6], args[7], args[8])
-    def moses_print_id(*args):
-        print(args[0][:-1]+'\t'+args[1], end='')
+    def moses_2_id(*args):
+        moses_2(*args)
         write_id_line(args[5], args[6], args[7], args[8])
-    def links_write_id(*args):
-        str_link = '<link {} />\n'.format(' '.join(
-            ['{}="{}"'.format(k, v) for k, v in args[5].items()]))
-        args[2].write(str_link)
-        write_id_line(args[5], args[6], args[7], args[8])
-    def links_print_id(*args):
-        str_link = '<link {} />\n'.format(' '.join(
-            ['{}="{}"'.format(k, v) for k, v in args[5].items()]))
-        print(str_link, end='')
+    def links_id(*args):
+        links(*args)
         write_id_line(args[5], args[6], args[7], args[8])
 
     def nothing(*args):
         pass
 
+    two_files = bool(write) and len(write) == 2
     if write_ids:
-        if wmode in ['normal', 'tmx'] and write:
-            return normal_write_ids
-        if wmode in ['normal', 'tmx'] and not write:
-            return normal_print_id
-        if wmode == 'moses' and not write:
-            return moses_print_id
-        if wmode == 'moses' and len(write) == 1:
-            return moses_write_id
-        if wmode == 'moses' and len(write) == 2:
-            return moses_write_2_id
-        if wmode == 'links'and write:
-            return links_write_id
-        if wmode == 'links'and not write:
-            return links_print_id
+        if wmode in ['normal', 'tmx']:
+            return normal_id
+        if wmode == 'moses':
+            return moses_2_id if two_files else moses_id
+        if wmode == 'links':
+            return links_id
     else:
-        if wmode in ['normal', 'tmx'] and write:
-            return normal_write
-        if wmode in ['normal', 'tmx'] and not write:
-            return normal_print
-        if wmode == 'moses' and not write:
-            return moses_print
-        if wmode == 'moses' and len(write) == 1:
-            return moses_write
-        if wmode == 'moses' and len(write) == 2:
-            return moses_write_2
-        if wmode == 'links'and write:
-            return links_write
-        if wmode == 'links'and not write:
-            return links_print
+        if wmode in ['normal', 'tmx']:
+            return normal
+        if wmode == 'moses':
+            return moses_2 if two_files else moses
+        if wmode == 'links':
+            return links
     return nothing
 
 def sentence_format_type(wmode, fromto):
     """Select function for formatting sentences"""
 
+    separator = '\n================================'
+    tmx_src_start = '\t\t<tu>\n\t\t\t<tuv xml:lang="' + fromto[0] + '"><seg>'
+    tmx_trg_start = '\n\t\t\t<tuv xml:lang="' + fromto[1] + '"><seg>'
+
+    #Records are joined from their parts once, most alignments have only
+    #one sentence per side and are concatenated directly
+
     def normal_src(sentences, ids):
-        result = '\n================================'
-        for i, sentence in enumerate(sentences):
-            result += ('\n(src)="'+ids[i]+'">'+sentence)
-        return result
+        if len(sentences) == 1:
+            return separator+'\n(src)="'+ids[0]+'">'+sentences[0]
+        parts = [separator]
+        for s_id, sentence in zip(ids, sentences):
+            parts += ('\n(src)="', s_id, '">', sentence)
+        return ''.join(parts)
 
     def normal_trg(sentences, ids):
-        result = ''
-        for i, sentence in enumerate(sentences):
-            result += ('\n(trg)="'+ids[i]+'">'+sentence)
-        return result
+        if len(sentences) == 1:
+            return '\n(trg)="'+ids[0]+'">'+sentences[0]
+        parts = []
+        for t_id, sentence in zip(ids, sentences):
+            parts += ('\n(trg)="', t_id, '">', sentence)
+        return ''.join(parts)
 
     def tmx_src(sentences, ids):
-        result = ''
-        for sentence in sentences:
-            result += '\t\t<tu>'
-            result += ('\n\t\t\t<tuv xml:lang="' + fromto[0] + '"><seg>')
-            result += html.escape(sentence, quote=False) + '</seg></tuv>'
-        return result
+        return ''.join([tmx_src_start+html.escape(sentence, quote=False)+
+            '</seg></tuv>' for sentence in sentences])
 
     def tmx_trg(sentences, ids):
-        result = ''
-        for sentence in sentences:
-            result += ('\n\t\t\t<tuv xml:lang="' + fromto[1] + '"><seg>')
-            result += html.escape(sentence, quote=False) + '</seg></tuv>'
-            result += '\n\t\t</tu>\n'
-        return result
+        return ''.join([tmx_trg_start+html.escape(sentence, quote=False)+
+            '</seg></tuv>\n\t\t</tu>\n' for sentence in sentences])
 
+    #The line ending is added when the pair is written
     def moses(sentences, ids):
-        result = ' '.join(sentences) + '\n'
-        return result
+        return ' '.join(sentences)
 
     format_fs = {'normal': (normal_src, normal_trg),
             'tmx': (tmx_src, tmx_trg),
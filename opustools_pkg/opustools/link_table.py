@@ -0,0 +1,161 @@
+from collections import Counter
+
+import numpy as np
+
+from .parse.alignment_parser import AlignmentParser, parse_range
+from .parse.block_parser import CHUNK_SIZE
+
+def to_float(value):
+    try:
+        return float(value)
+    except ValueError:
+        return np.nan
+
+class LinkTable:
+
+    def __init__(self, alignment_file, attributes=None,
+            chunk_size=CHUNK_SIZE):
+        """Load the links of an xces alignment file into columns for
+        filtering and statistics.
+
+        Columns:
+        doc_pairs -- List of (fromDoc, toDoc) names of the linkGrps
+        doc_index -- Index of the document pair of each link
+        src_counts, trg_counts -- Number of source and target ids of
+            each link
+        src_ids, trg_ids -- Source and target ids of all links, the ids of
+            link i start at src_offsets[i] and trg_offsets[i]
+        attributes -- Dictionary of float columns of link attributes,
+            NaN when a link does not have the attribute or its value is
+            not a number
+
+        Positional arguments:
+        alignment_file -- Alignment file to be read
+
+        Keyword arguments:
+        attributes -- Names of the attributes stored as columns (default
+            all attributes except xtargets and id)
+        chunk_size -- Size of the chunks fed to the xml parser
+        """
+
+        ap = AlignmentParser(alignment_file, chunk_size=chunk_size)
+
+        self.doc_pairs = []
+        doc_index, src_counts, trg_counts = [], [], []
+        src_ids, trg_ids = [], []
+        #Attribute name -> (link numbers, values)
+        attr_values = {}
+        if attributes is not None:
+            attr_values = {name: ([], []) for name in attributes}
+
+        link_num = 0
+        links, _, _, src_doc, trg_doc = ap.collect_link_records()
+        while src_doc:
+            doc_num = len(self.doc_pairs)
+            self.doc_pairs.append((src_doc, trg_doc))
+            for s_id, t_id, link_attr in links:
+                doc_index.append(doc_num)
+                src_counts.append(len(s_id))
+                trg_counts.append(len(t_id))
+                src_ids.extend(s_id)
+                trg_ids.extend(t_id)
+                for name, value in link_attr.items():
+                    if name in attr_values:
+                        columns = attr_values[name]
+                    elif (attributes is None and
+                            name not in ('xtargets', 'id')):
+                        columns = attr_values.setdefault(name, ([], []))
+                    else:
+                        continue
+                    columns[0].append(link_num)
+                    columns[1].append(to_float(value))
+                link_num += 1
+            links, _, _, src_doc, trg_doc = ap.collect_link_records()
+        ap.bp.close_document()
+
+        self.doc_index = np.array(doc_index, dtype=np.int64)
+        self.src_counts = np.array(src_counts, dtype=np.int64)
+        self.trg_counts = np.array(trg_counts, dtype=np.int64)
+        self.src_ids = np.array(src_ids, dtype=object)
+        self.trg_ids = np.array(trg_ids, dtype=object)
+        self.src_offsets = np.concatenate(([0], np.cumsum(self.src_counts)))
+        self.trg_offsets = np.concatenate(([0], np.cumsum(self.trg_counts)))
+
+        self.attributes = {}
+        for name, (link_nums, values) in attr_values.items():
+            column = np.full(link_num, np.nan)
+            column[link_nums] = values
+            self.attributes[name] = column
+
+    def __len__(self):
+        return len(self.src_counts)
+
+    def mask(self, src_range='all', trg_range='all', attribute=None,
+            threshold=None, leave_non_alignments_out=False):
+        """Return a boolean array of the links that pass the filters.
+
+        The filters work like the filters of OpusRead and
+        AlignmentParser.
+
+        Keyword arguments:
+        src_range -- Number of source sentences in alignment (default all)
+        trg_range -- Number of target sentences in alignment (default all)
+        attribute -- Attribute whose score is compared to threshold
+        threshold -- Minimum attribute score
+        leave_non_alignments_out -- Leave out links without source or
+            target ids
+        """
+        mask = np.ones(len(self), dtype=bool)
+        src_range = parse_range(src_range)
+        trg_range = parse_range(trg_range)
+        if src_range != 'all':
+            mask &= np.isin(self.src_counts, list(src_range))
+        if trg_range != 'all':
+            mask &= np.isin(self.trg_counts, list(trg_range))
+        if attribute and threshold is not None:
+            mask &= self.get_attribute(attribute) >= float(threshold)
+        if leave_non_alignments_out:
+            mask &= (self.src_counts > 0) & (self.trg_counts > 0)
+        return mask
+
+    def get_attribute(self, attribute):
+        """Return the column of an attribute, all NaN if no link has the
+        attribute"""
+        column = self.attributes.get(attribute)
+        if column is None:
+            column = np.full(len(self), np.nan)
+        return column
+
+    def shape_histogram(self, mask=None):
+        """Return a Counter of (source count, target count) alignment
+        shapes, e.g. {(1, 1): 120, (2, 1): 7}"""
+        src_counts, trg_counts = self.src_counts, self.trg_counts
+        if mask is not None:
+            src_counts, trg_counts = src_counts[mask], trg_counts[mask]
+        shapes, counts = np.unique(np.stack((src_counts, trg_counts)),
+                axis=1, return_counts=True)
+        return Counter({(int(s), int(t)): int(c)
+            for (s, t), c in zip(shapes.T, counts)})
+
+    def threshold_sweep(self, attribute, thresholds, mask=None):
+        """Return the number of links whose attribute score is at least
+        each of the thresholds"""
+        column = self.get_attribute(attribute)
+        if mask is not None:
+            column = column[mask]
+        scores = np.sort(column[~np.isnan(column)])
+        thresholds = np.asarray(thresholds, dtype=float)
+        return len(scores) - np.searchsorted(scores, thresholds, side='left')
+
+    def links(self, mask=None):
+        """Yield (fromDoc, toDoc, source ids, target ids) of the links,
+        or of the links selected by mask"""
+        if mask is None:
+            indexes = range(len(self))
+        else:
+            indexes = np.flatnonzero(mask)
+        for i in indexes:
+            src_doc, trg_doc = self.doc_pairs[self.doc_index[i]]
+            yield (src_doc, trg_doc,
+                tuple(self.src_ids[self.src_offsets[i]:self.src_offsets[i+1]]),
+                tuple(self.trg_ids[self.trg_offsets[i]:self.trg_offsets[i+1]]))
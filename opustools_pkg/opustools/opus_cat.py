@@ -6,29 +6,26 @@ from .opus_get import OpusGet
 from .parse.sentence_parser import SentenceParser
 
 def parse_type(preprocessing, get_annotations):
-    def xml_parse(bp, block, sentence, sentences, id_set):
+    def xml_parse(block, sentence, sentences):
         if block.name == 's':
             sid = block.attributes['id']
             sentence = ' '.join(sentence)
             sentences[sid] = (sentence, block.attributes)
             sentence = []
         elif block.name == 'w':
-            s_parent = bp.tag_in_parents('s', block)
-            if s_parent:
+            if block.sentence:
                 data = block.data.strip()
                 sentence.append(data)
         return sentence
 
-    def parsed_parse(bp, block, sentence, sentences, id_set):
-        s_parent = bp.tag_in_parents('s', block)
+    def parsed_parse(block, sentence, sentences):
         if block.name == 's':
             sid = block.attributes['id']
             sentence = ' '.join(sentence)
             sentences[sid] = (sentence, block.attributes)
             sentence = []
         elif block.name == 'w':
-            s_parent = bp.tag_in_parents('s', block)
-            if s_parent:
+            if block.sentence:
                 data = block.data.strip()
                 data += get_annotations(block)
                 sentence.append(data)
@@ -137,7 +134,7 @@ class OpusCat:
         if self.plain:
             spar = SentenceParser(f, self.preprocess,
                 self.set_attribute, self.change_annotation_delimiter)
-            spar.store_sentences({})
+            spar.store_sentences(None)
             print('\n# '+n+'\n')
             for sid, attrs in spar.sentences.items():
                 if self.no_ids:
@@ -1,14 +1,19 @@
+import io
 import os
 import sys
 import zipfile
 
-from .util import file_open
+from .util import file_open, ReadAheadReader
 from .opus_get import OpusGet
+from .parse.sentence_index import SentenceIndex
+from .parse.compiled_alignment import CompiledAlignment, find_compiled
+from .parse.alignment_index import AlignmentIndex, find_doc_pair
 
 class OpusFileHandler:
 
     def __init__(self, download_dir, source_zip, target_zip, directory,
-            release, preprocess, fromto, verbose, suppress_prompts):
+            release, preprocess, fromto, verbose, suppress_prompts,
+            sentence_index=False):
 
         self.directory = directory
         self.release = release
@@ -24,6 +29,33 @@ class OpusFileHandler:
         self.trg_zip_name = target_zip
 
         self.zip_opened = False
+        #Paths of the zip files that were found and opened
+        self.opened_zip_names = None
+        #Numbers of the linkGrps where reading the alignment file starts
+        #and ends
+        self.alignment_start = 0
+        self.alignment_end = None
+        #Partial AlignmentIndex that is stored while the alignment file
+        #is read, see open_alignment_path
+        self.alignment_index = None
+
+        #Read only the needed sentences from zip files using sentence
+        #offset indexes stored next to the zip files
+        self.sentence_index = sentence_index
+        self.indexes = {}
+
+    def __getstate__(self):
+        """Zip files are not pickled, they are reopened from the same
+        paths when needed."""
+        state = self.__dict__.copy()
+        state.pop('src_zip', None)
+        state.pop('trg_zip', None)
+        state.pop('src_members', None)
+        state.pop('trg_members', None)
+        state['indexes'] = {}
+        state['alignment_index'] = None
+        state['zip_opened'] = False
+        return state
 
     def download_files(self):
         print('The following files are available for downloading:\n')
@@ -39,10 +71,15 @@ class OpusFileHandler:
         og = OpusGet(**arguments)
         og.get_files()
 
-    def open_alignment_file(self, align_name):
+    def open_alignment_file(self, align_name, start_doc_pair=None,
+            shard=None):
         """Open alignment file. Look first for specified file, then
         look for pre-downloaded local file, and finally, download
-        missing files"""
+        missing files
+
+        If start_doc_pair or shard is given, only a part of the document
+        pairs is read, see open_alignment_path.
+        """
 
         local_align_name = os.path.join(self.download_dir,
                 self.directory+'_'+ self.release+'_xml_'+self.fromto[0]+'-'+
@@ -50,19 +87,18 @@ class OpusFileHandler:
         if self.verbose: print('Reading alignment file ', end='')
 
         if os.path.isfile(align_name):
-            if self.verbose: print('"{}"'.format(align_name))
-            alignment = file_open(align_name, mode='r', encoding='utf-8')
+            alignment = self.open_alignment_path(align_name,
+                    start_doc_pair, shard)
         elif os.path.isfile(local_align_name):
-            if self.verbose: print('"{}"'.format(local_align_name))
-            alignment = file_open(local_align_name, mode='r', encoding='utf-8')
+            alignment = self.open_alignment_path(local_align_name,
+                    start_doc_pair, shard)
         else:
             print('No alignment file "{default}" or "{downloaded}" found'.format(
                 default=align_name, downloaded=local_align_name))
             self.download_files()
             if os.path.isfile(local_align_name):
-                if self.verbose: print('"{}"'.format(local_align_name))
-                alignment = file_open(
-                    local_align_name, mode='r', encoding='utf-8')
+                alignment = self.open_alignment_path(local_align_name,
+                        start_doc_pair, shard)
             else:
                 raise FileNotFoundError('No alignment file "{default}" or'
                         ' "{downloaded}" found'.format(
@@ -70,6 +106,70 @@ class OpusFileHandler:
 
         return alignment
 
+    def open_alignment_path(self, align_name, start_doc_pair=None,
+            shard=None):
+        """Open an alignment file, or its compiled version if the file
+        itself is compiled or an up to date compiled file exists next to
+        it
+
+        start_doc_pair is the number of the linkGrp to start reading from
+        (counting from 0) or its fromDoc name. shard is a (shard index,
+        number of shards) tuple, and only the shard index'th of equally
+        sized contiguous slices of the linkGrps is read. An uncompiled
+        file is opened at the first linkGrp to read using an
+        AlignmentIndex stored next to it. The number of the first linkGrp
+        is stored in alignment_start and the number after the last one in
+        alignment_end.
+
+        If there is no complete AlignmentIndex, the index is stored in
+        alignment_index, and the positions of the linkGrps are added to
+        it while the file is parsed, see OpusRead.save_alignment_index.
+        """
+        compiled_name = find_compiled(align_name)
+        if compiled_name:
+            if self.verbose: print('"{}"'.format(compiled_name))
+            alignment = CompiledAlignment(compiled_name)
+            if start_doc_pair is not None or shard is not None:
+                self.set_doc_pair_range(alignment.directory, start_doc_pair,
+                        shard)
+                alignment.position = self.alignment_start
+            return alignment
+        if self.verbose: print('"{}"'.format(align_name))
+        #The xml parser reads bytes, the files are not decoded
+        index = AlignmentIndex(align_name, build=False)
+        if start_doc_pair is not None or shard is not None:
+            if not index.covers(start_doc_pair, shard):
+                index.build()
+            self.set_doc_pair_range(index.doc_pairs, start_doc_pair, shard)
+            alignment = index.open_at(self.alignment_start)
+        elif index.is_complete():
+            alignment = file_open(align_name, mode='rb')
+        else:
+            alignment = index.open_at(0)
+        if not index.is_complete():
+            self.alignment_index = index
+            if index.seekable_gzip:
+                #The restart points are exported from the file while it
+                #is read, so it is read in the main thread
+                return alignment
+        if align_name.endswith(('.gz', '.bz2')):
+            return ReadAheadReader(alignment)
+        return alignment
+
+    def set_doc_pair_range(self, doc_pairs, start_doc_pair, shard):
+        """Find the range of linkGrps to read"""
+        start, end = 0, None
+        if shard is not None:
+            shard_index, num_shards = shard
+            start = len(doc_pairs)*shard_index//num_shards
+            end = len(doc_pairs)*(shard_index+1)//num_shards
+        if start_doc_pair is not None:
+            start = max(start, find_doc_pair(doc_pairs, start_doc_pair))
+        if end is not None:
+            start = min(start, end)
+        self.alignment_start = start
+        self.alignment_end = end
+
     def open_specific_zips(self, src_zip_name, trg_zip_name):
         if self.verbose:
             print('Opening zip archive "{}" ... '.format(src_zip_name),
@@ -82,8 +182,24 @@ class OpusFileHandler:
         trg_zip = zipfile.ZipFile(trg_zip_name, 'r')
         if self.verbose:
             print('Done')
+        self.opened_zip_names = (src_zip_name, trg_zip_name)
+        self.src_members = self.map_members(src_zip)
+        self.trg_members = self.map_members(trg_zip)
         return src_zip, trg_zip
 
+    def map_members(self, zip_file):
+        """Map the document names used in alignment files to the names
+        of the members in a zip file"""
+        #Names with the OPUS directory and preprocessing prefix take
+        #precedence over identical names without it, see get_opus_doc_name
+        prefix = self.directory+'/'+self.preprocess+'/'
+        members = {}
+        for name in zip_file.namelist():
+            members.setdefault(name, name)
+            if name.startswith(prefix):
+                members[name[len(prefix):]+'.gz'] = name
+        return members
+
     def open_zipfiles(self):
         """Open zip files. Look first for specified zip files, then
         look for pre-downloaded local files, and finally, download
@@ -94,7 +210,10 @@ class OpusFileHandler:
         local_trg_name = os.path.join(self.download_dir, self.directory+'_'+
                 self.release+'_'+ self.preprocess+'_'+self.fromto[1]+'.zip')
 
-        if os.path.isfile(self.src_zip_name) and os.path.isfile(self.trg_zip_name):
+        if self.opened_zip_names:
+            self.src_zip, self.trg_zip = self.open_specific_zips(
+                    *self.opened_zip_names)
+        elif os.path.isfile(self.src_zip_name) and os.path.isfile(self.trg_zip_name):
             self.src_zip, self.trg_zip = self.open_specific_zips(
                     self.src_zip_name, self.trg_zip_name)
         elif os.path.isfile(local_src_name) and os.path.isfile(local_trg_name):
@@ -114,43 +233,113 @@ class OpusFileHandler:
 
         self.zip_opened = True
 
-    def open_sentence_file(self, doc_name, direction):
+    def needs_zipfiles(self, doc_name):
+        """Check if a document has to be read from zip files that have
+        not been opened yet"""
+        return not (self.zip_opened or
+                os.path.isfile(os.path.join(self.download_dir, doc_name)))
+
+    def find_zip_member(self, doc_name, direction):
+        """Return the zip file and the name of the zip member that
+        contains a sentence file"""
+        if not self.zip_opened:
+            self.open_zipfiles()
+
+        if direction == 'src':
+            zip_file, zip_name = self.src_zip, self.src_zip_name
+            members = self.src_members
+        else:
+            zip_file, zip_name = self.trg_zip, self.trg_zip_name
+            members = self.trg_members
+
+        member = members.get(doc_name)
+        if member is None:
+            raise KeyError("There is no item named {!r} in the archive "
+                    "'{}'".format(doc_name, zip_name))
+        return zip_file, member
+
+    def get_opus_doc_name(self, doc_name):
+        #In OPUS, directory and preprocessing information need to be added and
+        #the ".gz" ending needs to be removed.
+        return self.directory+'/'+self.preprocess+'/'+doc_name[:-3]
+
+    def get_sentence_file_key(self, doc_name, direction):
+        """Return a key that identifies a sentence file and changes when
+        the file changes"""
+        local_doc = os.path.join(self.download_dir, doc_name)
+        if os.path.isfile(local_doc):
+            stat = os.stat(local_doc)
+            return (os.path.abspath(local_doc), stat.st_mtime_ns,
+                    stat.st_size)
+        zip_file, member = self.find_zip_member(doc_name, direction)
+        return (os.path.abspath(zip_file.filename), member,
+                zip_file.getinfo(member).CRC)
+
+    def open_sentence_file(self, doc_name, direction, id_set=None,
+            prefetched=None):
+        """Open sentence file. Look first for a local file, then for the
+        file in the zip file of the given direction.
+
+        If sentence indexing is enabled and id_set is given, only the
+        sentences whose ids are in id_set are read from stored
+        (uncompressed) members of the zip file.
+        prefetched is a (member name, contents) tuple returned by
+        read_zip_member, which is used instead of reading the zip file.
+        """
         local_doc = os.path.join(self.download_dir, doc_name)
         try:
-            return file_open(local_doc)
+            #Like zip members, local files are read as bytes
+            return file_open(local_doc, mode='rb')
         except FileNotFoundError:
             pass
 
         if not self.zip_opened:
             self.open_zipfiles()
 
-        #In OPUS, directory and preprocessing information need to be added and
-        #the ".gz" ending needs to be removed.
-        opus_doc_name = self.directory+'/'+self.preprocess+'/'+doc_name[:-3]
-
         if self.verbose: print('Reading {}_file "{}"'.format(
-            direction, opus_doc_name))
+            direction, self.get_opus_doc_name(doc_name)))
 
+        if prefetched is not None:
+            member, data = prefetched
+            document = io.BytesIO(data)
+            document.name = member
+            return document
+
+        zip_file, member = self.find_zip_member(doc_name, direction)
+        #Seeking in a compressed member decompresses everything before
+        #the offset, so only stored members are read using the index
+        if (self.sentence_index and id_set is not None and
+                zip_file.getinfo(member).compress_type == zipfile.ZIP_STORED):
+            return self.get_index(zip_file).open_sentences(member, id_set)
+        return zip_file.open(member, 'r')
+
+    def read_zip_member(self, doc_name, direction):
+        """Read a sentence file from an opened zip file into memory and
+        return the member name and the contents. Return None if the file
+        is a local file, the zip files have not been opened or the file
+        is not found. Nothing is printed, so that this can be called from
+        a background thread."""
+        if (not self.zip_opened or
+                os.path.isfile(os.path.join(self.download_dir, doc_name))):
+            return None
         try:
-            if direction == 'src':
-                if opus_doc_name in self.src_zip.namelist():
-                    doc = self.src_zip.open(opus_doc_name, 'r')
-                else:
-                    doc = self.src_zip.open(doc_name, 'r')
-        except KeyError as e:
-            raise KeyError(e.args[0]+" '"+self.src_zip_name+"'")
-        try:
-            if direction == 'trg':
-                if opus_doc_name in self.trg_zip.namelist():
-                    doc = self.trg_zip.open(opus_doc_name, 'r')
-                else:
-                    doc = self.trg_zip.open(doc_name, 'r')
-        except KeyError as e:
-            raise KeyError(e.args[0]+" '"+self.trg_zip_name+"'")
-        return doc
+            zip_file, member = self.find_zip_member(doc_name, direction)
+        except KeyError:
+            return None
+        return member, zip_file.read(member)
+
+    def get_index(self, zip_file):
+        index = self.indexes.get(zip_file.filename)
+        if index is None:
+            index = SentenceIndex(zip_file)
+            self.indexes[zip_file.filename] = index
+        return index
 
     def close_zipfiles(self):
         if self.zip_opened:
             self.src_zip.close()
             self.trg_zip.close()
 
+        for index in self.indexes.values():
+            index.close()
+        self.indexes = {}
@@ -11,7 +11,7 @@ identifier = LanguageIdentifier.from_modelstring(model, norm_probs=True)
 
 from .parse.sentence_parser import SentenceParser
 
-def xml_parse(bp, block, sentence, sentences, id_set):
+def xml_parse(block, sentence, sentences):
     if block.name == 's':
         sid = block.attributes['id']
         sentence.append(block.data.strip())
@@ -19,8 +19,7 @@ def xml_parse(bp, block, sentence, sentences, id_set):
         sentences[sid] = (sentence, block.attributes)
         sentence = []
     elif block.name == 'w':
-        s_parent = bp.tag_in_parents('s', block)
-        if s_parent:
+        if block.sentence:
             data = block.data.strip()
             sentence.append(data)
     return sentence
@@ -120,7 +119,7 @@ class OpusLangid:
                             with zip_arc.open(filename.filename) as infile:
                                 sparser = LanguageIdAdder(infile,
                                     self.suppress_errors, True, self.preprocess)
-                                sparser.store_sentences({})
+                                sparser.store_sentences(None)
                             with zip_arc.open(filename.filename) as infile:
                                 with open(tempxml[1], 'wb') as outfile:
                                     sparser.addIds(infile, outfile)
@@ -136,7 +135,7 @@ class OpusLangid:
                 with open(self.file_path, 'r') as infile:
                     sparser = LanguageIdAdder(infile,
                             self.suppress_errors, False, self.preprocess)
-                    sparser.store_sentences({})
+                    sparser.store_sentences(None)
                 with open(self.file_path, 'r') as infile:
                     sparser.addIds(infile, outfile)
 
@@ -1,9 +1,18 @@
+import io
 import os
 import re
+import pickle
+import contextlib
+from collections import Counter, deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import chain
 
 from .parse.alignment_parser import AlignmentParser
 from .parse.sentence_parser import SentenceParser, SentenceParserError
-from .util import file_open
+from .parse.sentence_index import SentenceIndexError
+from .parse.sentence_cache import SentenceCache, MemorySentenceCache
+from .util import file_open, OutputSink
+from .checkpoint import Checkpoint
 from .formatting import *
 from .opus_file_handler import OpusFileHandler
 
@@ -23,6 +32,159 @@ def skip_regex_type(n, N):
         return skip_re
     return nothing
 
+#Aligned sentences yielded by OpusRead.iter_pairs
+SentencePair = namedtuple('SentencePair', ['src_doc', 'trg_doc', 'src_ids',
+    'trg_ids', 'src_text', 'trg_text', 'link_attributes'])
+
+def count_ids(link_attrs):
+    """Count how many times each source and target sentence id occurs
+    in the links"""
+    src_counts, trg_counts = Counter(), Counter()
+    for link_a in link_attrs:
+        src_ids, trg_ids = link_a['xtargets'].split(';')
+        src_counts.update(src_ids.split())
+        trg_counts.update(trg_ids.split())
+    return src_counts, trg_counts
+
+
+class DocPairReader:
+
+    def __init__(self, of_handler, preprocess, src_annot, trg_annot,
+            preserve, annot_delimiter, write_mode, switch_langs,
+            lang_filters, form_sent_langs, sentence_cache=None):
+        """Open, parse and format the sentence files of document pairs.
+
+        A DocPairReader can be sent to worker processes. The file handler
+        reopens the zip files and the formatting functions are created
+        again in each worker.
+        """
+        self.args = (of_handler, preprocess, src_annot, trg_annot,
+                preserve, annot_delimiter, write_mode, switch_langs,
+                lang_filters, form_sent_langs, sentence_cache)
+
+        self.of_handler = of_handler
+        self.preprocess = preprocess
+        self.src_annot = src_annot
+        self.trg_annot = trg_annot
+        self.preserve = preserve
+        self.annot_delimiter = annot_delimiter
+        self.sentence_cache = sentence_cache
+
+        format_sentences = sentence_format_type(write_mode, form_sent_langs)
+        self.check_filters, self.check_lang = check_lang_conf_type(
+                lang_filters)
+        self.format_pair = pair_format_type(
+                write_mode, switch_langs, self.check_filters, self.check_lang,
+                format_sentences)
+
+    def __reduce__(self):
+        return (DocPairReader, self.args)
+
+    def open_parsers(self, link_attrs, src_set, trg_set, src_doc_name,
+            trg_doc_name, stream=False, prefetched=(None, None)):
+        """Open sentence files and return their sentence parsers
+
+        prefetched contains the source and target files read into memory
+        by OpusFileHandler.read_zip_member, or None for files that have
+        not been read.
+
+        Raises KeyError if a document is not found and SentenceParserError
+        if a document cannot be parsed.
+        """
+        src_key, trg_key = None, None
+        if self.sentence_cache is not None and not stream:
+            #Cached documents are parsed completely, so they are not read
+            #using the sentence index
+            src_key = self.of_handler.get_sentence_file_key(
+                    src_doc_name, 'src')
+            trg_key = self.of_handler.get_sentence_file_key(
+                    trg_doc_name, 'trg')
+
+        try:
+            src_doc = self.of_handler.open_sentence_file(src_doc_name, 'src',
+                    src_set if src_key is None else None, prefetched[0])
+            trg_doc = self.of_handler.open_sentence_file(trg_doc_name, 'trg',
+                    trg_set if trg_key is None else None, prefetched[1])
+        except SentenceIndexError as e:
+            raise SentenceParserError(e.message)
+
+        src_parser = SentenceParser(src_doc,
+                preprocessing=self.preprocess, anno_attrs=self.src_annot,
+                preserve=self.preserve, delimiter=self.annot_delimiter,
+                cache=self.sentence_cache, cache_key=src_key)
+        trg_parser = SentenceParser(trg_doc,
+                preprocessing=self.preprocess, anno_attrs=self.trg_annot,
+                preserve=self.preserve, delimiter=self.annot_delimiter,
+                cache=self.sentence_cache, cache_key=trg_key)
+        if stream:
+            src_counts, trg_counts = count_ids(link_attrs)
+            src_parser.stream_sentences(src_counts)
+            trg_parser.stream_sentences(trg_counts)
+        else:
+            src_parser.store_sentences(src_set)
+            trg_parser.store_sentences(trg_set)
+        return src_parser, trg_parser
+
+    def format_doc_pair(self, link_attrs, src_set, trg_set, src_doc_name,
+            trg_doc_name, stream=False, limit=-1):
+        """Read a document pair and format its sentence pairs
+
+        Returns an error message (or None) and a list of formatted
+        sentence pairs and their link attributes. When streaming, the
+        pairs formatted before an error are returned with the message.
+
+        Keyword arguments:
+        stream -- Parse the sentence files only as far as needed
+        limit -- Format at most this many sentence pairs (default -1, all
+            pairs). The sentence files are streamed if the limit is
+            reached within the document pair.
+        """
+        stream = stream or 0 < limit < len(link_attrs)
+        try:
+            src_parser, trg_parser = self.open_parsers(link_attrs,
+                    src_set, trg_set, src_doc_name, trg_doc_name, stream)
+        except KeyError as e:
+            return e.args[0], []
+        except SentenceParserError as e:
+            return e.message, []
+
+        results = []
+        try:
+            for link_a in link_attrs:
+                src_result, trg_result = self.format_pair(
+                        link_a, src_parser, trg_parser, None)
+                if src_result != -1:
+                    results.append((src_result, trg_result, link_a))
+                    if len(results) == limit:
+                        break
+        except SentenceParserError as e:
+            #Only possible when streaming
+            return e.message, results
+        finally:
+            if stream:
+                src_parser.close_document()
+                trg_parser.close_document()
+        return None, results
+
+def init_worker(pickled_reader):
+    #The reader is always unpickled, also when worker processes are
+    #forked, so that the workers do not share open zip files
+    global worker_reader
+    worker_reader = pickle.loads(pickled_reader)
+    of_handler = worker_reader.of_handler
+    if of_handler.opened_zip_names:
+        #The main process has already reported opening the zip files
+        with contextlib.redirect_stdout(io.StringIO()):
+            of_handler.open_zipfiles()
+
+def format_doc_pair_in_worker(args):
+    """Format a document pair in a worker process. The progress
+    messages are returned with the results and printed by the main
+    process before the output of the document pair."""
+    with contextlib.redirect_stdout(io.StringIO()) as messages:
+        message, results = worker_reader.format_doc_pair(*args)
+    return messages.getvalue(), message, results
+
 
 class OpusRead:
 
@@ -38,7 +200,12 @@ class OpusRead:
             change_annotation_delimiter='|',
             src_cld2=None, trg_cld2=None, src_langid=None, trg_langid=None,
             write_ids=None, suppress_prompts=False, download_dir='.',
-            preserve_inline_tags=False, n=None, N=None, verbose=False):
+            preserve_inline_tags=False, n=None, N=None, verbose=False,
+            stream=False, workers=1, sentence_index=False, cache_dir=None,
+            cache_size=1000, doc_cache_size=0, doc_cache_mb=None,
+            compress_threads=2, start_doc_pair=None, checkpoint=None,
+            checkpoint_interval=60, resume=False, shard_index=0,
+            num_shards=1, prefetch=0):
         """Read xces alignment files and xml sentence files and output in
         desired format.
 
@@ -83,8 +250,66 @@ class OpusRead:
         n -- Get only documents that match the regex
         N -- Skip all doucments that match the regex
         verbose -- Print progress messages
+        stream -- Parse sentence files only as far as needed for the
+            current sentence pair instead of reading whole documents
+            into memory first. This is done always for the document pair
+            where maximum is reached.
+        workers -- Number of processes used for reading and formatting
+            document pairs (default 1). Streaming, the maximum and
+            progress messages work as with a single process.
+        sentence_index -- Store the offsets of sentences in zip files in
+            index files next to the zip files (in memory if they cannot be
+            written) and read only the needed sentences using the indexes.
+            Only stored (uncompressed) zip members are read using the
+            indexes.
+        cache_dir -- Store parsed sentence files in this directory and
+            reuse them in later runs
+        cache_size -- Maximum size of the cache directory in megabytes
+            (default 1000)
+        doc_cache_size -- Keep this many parsed sentence files in memory
+            to reuse them when documents appear in several linkGrps
+            (default 0, no documents are kept)
+        doc_cache_mb -- Maximum approximate size of the parsed sentence
+            files kept in memory in megabytes
+        compress_threads -- Number of threads compressing output files
+            that end with .gz or .bz2 (default 2, 0 compresses in the
+            main thread)
+        start_doc_pair -- Start from this document pair, given as the
+            number of its linkGrp in the alignment file (counting from 0)
+            or as its source document name. The positions of the linkGrps
+            are stored in an index file next to the alignment file when
+            the alignment file is read.
+        checkpoint -- Save the progress of the run in this file: the next
+            document pair, the number of sentence pairs written and the
+            sizes of the output files
+        checkpoint_interval -- Minimum number of seconds between saving
+            checkpoints (default 60)
+        resume -- Continue from the checkpoint if the checkpoint file
+            exists. The output files are truncated to their sizes in the
+            checkpoint and the run continues from the next document pair.
+            The alignment file, document selection and output arguments
+            must be the same as in the run that saved the checkpoint.
+        shard_index -- Read only this slice of the document pairs,
+            counting from 0 (default 0)
+        num_shards -- Number of equally sized contiguous slices of the
+            linkGrps in the alignment file (default 1). The first shard
+            writes the file header and the last one the file ending, so
+            the outputs of all shards concatenated in order are the same
+            as the output of a single run. The maximum applies to each
+            shard separately.
+        prefetch -- Read the sentence files of up to this many next
+            document pairs from the zip files in a background thread
+            while the current document pair is written (default 0, no
+            prefetching). Not used with stream, sentence_index, the
+            sentence file caches or several workers.
         """
 
+        if not 0 <= shard_index < num_shards:
+            raise ValueError('Shard index {} is not between 0 and {}'.format(
+                shard_index, num_shards-1))
+        self.shard_index = shard_index
+        self.num_shards = num_shards
+
         self.fromto = sorted([source, target])
         fromto_copy = [source, target]
         self.switch_langs = fromto_copy != self.fromto
@@ -137,20 +362,57 @@ class OpusRead:
                 target_zip = os.path.join(root_directory, directory, release,
                     preprocess, self.fromto[1]+'.zip')
 
+        #Progress is saved in the checkpoint file, and a resumed run
+        #continues from the state in the file if it exists
+        self.checkpoint = None
+        self.resume_state = None
+        self.resumed = False
+        self.resumed_total = 0
+        if checkpoint:
+            #A run can be resumed only with the arguments that select and
+            #format the same output
+            parameters = {'alignment_file': os.path.abspath(self.alignment),
+                'source': source, 'target': target, 'preprocess': preprocess,
+                'src_range': src_range, 'tgt_range': tgt_range,
+                'source_zip': os.path.abspath(source_zip),
+                'target_zip': os.path.abspath(target_zip),
+                'attribute': attribute, 'threshold': threshold,
+                'leave_non_alignments_out': leave_non_alignments_out,
+                'src_cld2': src_cld2, 'trg_cld2': trg_cld2,
+                'src_langid': src_langid, 'trg_langid': trg_langid,
+                'n': n, 'N': N, 'start_doc_pair': start_doc_pair,
+                'shard_index': shard_index, 'num_shards': num_shards,
+                'write': write, 'write_ids': write_ids,
+                'write_mode': write_mode,
+                'print_file_names': print_file_names,
+                'change_moses_delimiter': change_moses_delimiter,
+                'print_annotations': print_annotations,
+                'source_annotations': source_annotations,
+                'target_annotations': target_annotations,
+                'change_annotation_delimiter': change_annotation_delimiter,
+                'preserve_inline_tags': preserve_inline_tags}
+            self.checkpoint = Checkpoint(checkpoint, checkpoint_interval,
+                    parameters)
+            #Compressed files can be truncated only between the blocks
+            #written by the parallel writer
+            compress_threads = compress_threads or 1
+            state = self.checkpoint.load() if resume else None
+            if state:
+                self.resume_state = state
+                start_doc_pair = state['doc_pair']
+                self.resumed = True
+                self.resumed_total = state['total']
+                if verbose:
+                    print('Resuming from document pair {}'.format(
+                        start_doc_pair))
+        self.compress_threads = compress_threads
+
+        #Output sinks are opened by open_outputs when pairs are printed
         self.resultfile = None
         self.mosessrc = None
         self.mosestrg = None
-
         self.id_file = None
-        if write_ids:
-            self.id_file = file_open(write_ids, 'w', encoding='utf-8')
-
-        if write:
-            if write_mode == 'moses' and len(write) == 2:
-                self.mosessrc = file_open(write[0], mode='w', encoding='utf-8')
-                self.mosestrg = file_open(write[1], mode='w', encoding='utf-8')
-            else:
-                self.resultfile = file_open(write[0], mode='w', encoding='utf-8')
+        self.output_files = []
 
         self.write_mode = write_mode
         self.write = write
@@ -162,6 +424,12 @@ class OpusRead:
         self.write_ids=write_ids
 
         self.preserve = preserve_inline_tags
+        self.stream = stream
+        self.workers = workers
+        self.prefetch = prefetch
+        if stream or sentence_index or cache_dir or doc_cache_size or \
+                doc_cache_mb:
+            self.prefetch = 0
 
         self.src_annot = source_annotations
         self.trg_annot = target_annotations
@@ -169,10 +437,10 @@ class OpusRead:
 
         self.skip_doc = skip_regex_type(n, N)
 
-        self.add_file_header = file_header_type(write_mode, write, source)
+        self.add_file_header = file_header_type(write_mode, source)
         self.add_doc_names = doc_name_type(write_mode, write, print_file_names)
-        self.add_doc_ending = doc_ending_type(write_mode, write)
-        self.add_file_ending = file_ending_type(write_mode, write)
+        self.add_doc_ending = doc_ending_type(write_mode)
+        self.add_file_ending = file_ending_type(write_mode)
 
         self.out_put_pair = out_put_type(
                 write_mode, write, write_ids, self.switch_langs, attribute,
@@ -181,108 +449,419 @@ class OpusRead:
         form_sent_langs = self.fromto.copy()
         if self.switch_langs:
             form_sent_langs = [self.fromto[1], self.fromto[0]]
-        format_sentences = sentence_format_type(write_mode, form_sent_langs)
-
-        check_filters, self.check_lang = check_lang_conf_type(lang_filters)
-        self.format_pair = pair_format_type(
-                write_mode, self.switch_langs, check_filters, self.check_lang,
-                format_sentences)
 
         self.of_handler = OpusFileHandler(
                 download_dir, source_zip, target_zip, directory, release,
-                preprocess, self.fromto, self.verbose, suppress_prompts)
-
-        self.alignment = self.of_handler.open_alignment_file(self.alignment)
+                preprocess, self.fromto, self.verbose, suppress_prompts,
+                sentence_index)
+
+        sentence_cache = None
+        if cache_dir:
+            sentence_cache = SentenceCache(cache_dir,
+                    max_size=cache_size*1024*1024)
+        self.doc_cache = None
+        if doc_cache_size or doc_cache_mb:
+            #Each worker process keeps its own documents in memory
+            self.doc_cache = MemorySentenceCache(
+                    max_documents=doc_cache_size or None,
+                    max_size=doc_cache_mb and doc_cache_mb*1024*1024,
+                    next_cache=sentence_cache)
+            sentence_cache = self.doc_cache
+
+        self.pair_reader = DocPairReader(self.of_handler, self.preprocess,
+                self.src_annot, self.trg_annot, self.preserve,
+                self.annot_delimiter, write_mode, self.switch_langs,
+                lang_filters, form_sent_langs, sentence_cache)
+        self.format_pair = self.pair_reader.format_pair
+        self.check_lang = self.pair_reader.check_lang
+
+        shard = None
+        if num_shards > 1:
+            shard = (shard_index, num_shards)
+        self.alignment = self.of_handler.open_alignment_file(self.alignment,
+                start_doc_pair, shard)
         self.alignmentParser = AlignmentParser(self.alignment,
                 (src_range, tgt_range), attribute, threshold,
                 leave_non_alignments_out)
+        #Number of linkGrps read, counting also those before the start
+        self.doc_pairs_read = self.of_handler.alignment_start
+
+    def open_outputs(self):
+        """Open the output files, or stdout if no files are given. In a
+        resumed run, the files are truncated to their sizes in the
+        checkpoint and continued."""
+        output_mode = 'w'
+        output_names = list(self.write or []) + (
+                [self.write_ids] if self.write_ids else [])
+        if self.resume_state:
+            self.checkpoint.restore_outputs(self.resume_state, output_names)
+            output_mode = 'a'
+
+        #Output is collected in sinks that write it in large blocks
+        if self.write_ids:
+            self.id_file = OutputSink(
+                    file_open(self.write_ids, output_mode, encoding='utf-8',
+                        compress_threads=self.compress_threads))
+
+        if self.write:
+            if self.write_mode == 'moses' and len(self.write) == 2:
+                self.mosessrc = OutputSink(
+                        file_open(self.write[0], mode=output_mode,
+                            encoding='utf-8',
+                            compress_threads=self.compress_threads))
+                self.mosestrg = OutputSink(
+                        file_open(self.write[1], mode=output_mode,
+                            encoding='utf-8',
+                            compress_threads=self.compress_threads))
+                sinks = [self.mosessrc, self.mosestrg]
+            else:
+                self.resultfile = OutputSink(
+                        file_open(self.write[0], mode=output_mode,
+                            encoding='utf-8',
+                            compress_threads=self.compress_threads))
+                sinks = [self.resultfile]
+        else:
+            self.resultfile = OutputSink()
+            sinks = []
+        if self.id_file:
+            sinks.append(self.id_file)
+        self.output_files = list(zip(output_names, sinks))
+
+    def doc_pairs(self):
+        """Yield the links and document names of each document pair
+        that is not skipped"""
+        end = self.of_handler.alignment_end
+        while end is None or self.doc_pairs_read < end:
+            link_attrs, src_set, trg_set, src_doc_name, trg_doc_name = \
+                self.alignmentParser.collect_links()
+
+            if not src_doc_name:
+                break
+            self.doc_pairs_read += 1
+
+            if self.skip_doc(src_doc_name):
+                continue
+
+            yield link_attrs, src_set, trg_set, src_doc_name, trg_doc_name
+
+    def prefetch_doc_pairs(self):
+        """Yield each document pair with its linkGrp number and its
+        sentence files prefetched from the zip files, see
+        OpusFileHandler.read_zip_member. The files are read in a
+        background thread up to self.prefetch document pairs ahead."""
+        doc_pairs = self.doc_pairs()
+        read_files = (self.write_mode != 'links' or self.check_lang)
+        if not (self.prefetch and read_files):
+            for doc_pair in doc_pairs:
+                yield doc_pair, self.doc_pairs_read-1, (None, None)
+            return
+
+        first_pair = next(doc_pairs, None)
+        if first_pair is None:
+            return
+        if (self.of_handler.needs_zipfiles(first_pair[3]) or
+                self.of_handler.needs_zipfiles(first_pair[4])):
+            #Zip files are opened in the main thread, which may print
+            #messages
+            self.flush_output()
+            self.of_handler.open_zipfiles()
+
+        def read_doc_pair(src_doc_name, trg_doc_name):
+            return (self.of_handler.read_zip_member(src_doc_name, 'src'),
+                    self.of_handler.read_zip_member(trg_doc_name, 'trg'))
+
+        pending = deque()
+        executor = ThreadPoolExecutor(max_workers=1)
+        try:
+            for doc_pair in chain([first_pair], doc_pairs):
+                pending.append((doc_pair, self.doc_pairs_read-1,
+                    executor.submit(read_doc_pair, doc_pair[3], doc_pair[4])))
+                if len(pending) > self.prefetch:
+                    doc_pair, doc_pair_num, future = pending.popleft()
+                    yield doc_pair, doc_pair_num, future.result()
+            while pending:
+                doc_pair, doc_pair_num, future = pending.popleft()
+                yield doc_pair, doc_pair_num, future.result()
+        finally:
+            for doc_pair in pending:
+                doc_pair[2].cancel()
+            executor.shutdown()
+
+    def flush_output(self):
+        """Write the output collected so far, so that messages printed
+        to stdout appear in the right place"""
+        if self.resultfile:
+            self.resultfile.flush()
+
+    def save_checkpoint(self, doc_pair, total, force=False):
+        """Save the checkpoint if it is due. doc_pair is the number of the
+        first linkGrp whose output has not been written completely."""
+        if self.checkpoint and (force or self.checkpoint.is_due()):
+            #A resumed run finds the linkGrp to start from in the index
+            self.save_alignment_index()
+            self.checkpoint.save(doc_pair, total, self.output_files)
+
+    def save_alignment_index(self):
+        """Store the positions of the linkGrps parsed so far if the
+        alignment file has no complete AlignmentIndex yet"""
+        index = self.of_handler.alignment_index
+        if index is not None:
+            index.update(self.alignmentParser.bp.group_offsets,
+                    self.alignmentParser.bp.end_offset)
+
+    def print_error(self, message):
+        self.flush_output()
+        print('\n'+message+'\nContinuing from next sentence file pair.')
 
     def printPairs(self):
 
-        self.add_file_header(self.resultfile)
+        self.open_outputs()
+
+        #A resumed run continues the output files after the header
+        if not self.resumed and self.shard_index == 0:
+            self.add_file_header(self.resultfile)
+
+        if self.workers > 1 and (self.write_mode != 'links' or
+                self.check_lang):
+            progress = self.print_pairs_parallel()
+        else:
+            progress = self.print_pairs_serial()
+
+        #When the maximum was reached, the checkpoint was saved before
+        #the last document pair
+        if progress:
+            self.save_checkpoint(*progress, force=True)
+
+        if self.shard_index == self.num_shards-1:
+            self.add_file_ending(self.resultfile)
 
-        prev_src_doc_name = None
-        prev_trg_doc_name = None
+        self.save_alignment_index()
+        self.alignmentParser.bp.close_document()
+
+        for sink in (self.resultfile, self.mosessrc, self.mosestrg,
+                self.id_file):
+            if sink:
+                sink.close()
+
+        self.of_handler.close_zipfiles()
+
+        if self.verbose:
+            if self.doc_cache and self.workers == 1:
+                print('Parsed documents in memory: {} hits, {} misses'.format(
+                    self.doc_cache.hits, self.doc_cache.misses))
+            print('Done')
+
+    def print_pairs_serial(self):
 
         src_parser = None
         trg_parser = None
 
-        total = 0
+        total = self.resumed_total
+        if self.resumed and total == self.maximum:
+            return None
         stop = False
-        while True:
+        for doc_pair, doc_pair_num, prefetched in self.prefetch_doc_pairs():
             link_attrs, src_set, trg_set, src_doc_name, trg_doc_name = \
-                self.alignmentParser.collect_links()
+                    doc_pair
 
-            if not src_doc_name:
-                break
+            #The output of the previous document pairs is complete. If
+            #the maximum can be reached within this document pair, the
+            #checkpoint is saved so that a resumed run writes the whole
+            #document pair again.
+            self.save_checkpoint(doc_pair_num, total,
+                    force=0 < self.maximum - total <= len(link_attrs))
 
-            if self.skip_doc(src_doc_name):
-                continue
+            #When the maximum can be reached within this document pair,
+            #the documents are parsed only as far as needed
+            stream = self.stream or 0 < self.maximum - total < len(link_attrs)
 
             if (self.write_mode != 'links' or
                     (self.write_mode == 'links' and self.check_lang)):
+                if self.verbose or not self.of_handler.zip_opened:
+                    #Opening files may print messages
+                    self.flush_output()
                 try:
-                    src_doc = self.of_handler.open_sentence_file(src_doc_name, 'src')
-                    trg_doc = self.of_handler.open_sentence_file(trg_doc_name, 'trg')
+                    src_parser, trg_parser = self.pair_reader.open_parsers(
+                            link_attrs, src_set, trg_set, src_doc_name,
+                            trg_doc_name, stream, prefetched)
                 except KeyError as e:
-                    print('\n'+e.args[0]+'\nContinuing from next sentence file pair.')
+                    self.print_error(e.args[0])
                     continue
-
-                try:
-                    src_parser = SentenceParser(src_doc,
-                            preprocessing=self.preprocess, anno_attrs=self.src_annot,
-                            preserve=self.preserve, delimiter=self.annot_delimiter)
-                    src_parser.store_sentences(src_set)
-                    trg_parser = SentenceParser(trg_doc,
-                            preprocessing=self.preprocess, anno_attrs=self.trg_annot,
-                            preserve=self.preserve, delimiter=self.annot_delimiter)
-                    trg_parser.store_sentences(trg_set)
                 except SentenceParserError as e:
-                    print('\n'+e.message+'\nContinuing from next sentence file pair.')
+                    self.print_error(e.message)
                     continue
 
             self.add_doc_names(src_doc_name, trg_doc_name,
                     self.resultfile, self.mosessrc, self.mosestrg)
 
-            for link_a in link_attrs:
-                src_result, trg_result = self.format_pair(
-                        link_a, src_parser, trg_parser, self.fromto)
-
-                if src_result == -1:
-                    continue
-
-                self.out_put_pair(src_result, trg_result, self.resultfile,
-                        self.mosessrc, self.mosestrg, link_a, self.id_file,
-                        src_doc_name, trg_doc_name)
-
-                total +=1
-                if total == self.maximum:
-                    stop = True
-                    break
+            try:
+                for link_a in link_attrs:
+                    src_result, trg_result = self.format_pair(
+                            link_a, src_parser, trg_parser, self.fromto)
+
+                    if src_result == -1:
+                        continue
+
+                    self.out_put_pair(src_result, trg_result, self.resultfile,
+                            self.mosessrc, self.mosestrg, link_a, self.id_file,
+                            src_doc_name, trg_doc_name)
+
+                    total +=1
+                    if total == self.maximum:
+                        stop = True
+                        break
+            except SentenceParserError as e:
+                #Only possible when streaming, some pairs of the document
+                #may have been written already
+                self.add_doc_ending(self.resultfile)
+                self.print_error(e.message)
+                continue
+            finally:
+                if stream and src_parser:
+                    src_parser.close_document()
+                    trg_parser.close_document()
 
             self.add_doc_ending(self.resultfile)
 
             if stop:
-                break
-
-        self.add_file_ending(self.resultfile)
+                return None
 
-        self.alignmentParser.bp.close_document()
+        return self.doc_pairs_read, total
 
-        if self.write:
-            if self.write_mode == 'moses' and self.mosessrc:
-                self.mosessrc.close()
-                self.mosestrg.close()
-            else:
-                self.resultfile.close()
-
-        if self.write_ids:
-            self.id_file.close()
-
-        self.of_handler.close_zipfiles()
-
-        if self.verbose:
-            print('Done')
+    def iter_pairs(self):
+        """Yield aligned sentences as SentencePair records without
+        formatting or writing them.
 
+        The link and language filters, maximum and document selection
+        are applied as in printPairs, and the sentences are given in the
+        order of the source and target languages. Write options are
+        ignored and the output files are not opened.
+        """
+        total = 0
+        try:
+            for link_attrs, src_set, trg_set, src_doc_name, trg_doc_name in \
+                    self.doc_pairs():
+                stream = (self.stream or
+                        0 < self.maximum - total < len(link_attrs))
+                try:
+                    src_parser, trg_parser = self.pair_reader.open_parsers(
+                            link_attrs, src_set, trg_set, src_doc_name,
+                            trg_doc_name, stream)
+                except KeyError as e:
+                    self.print_error(e.args[0])
+                    continue
+                except SentenceParserError as e:
+                    self.print_error(e.message)
+                    continue
 
+                try:
+                    for link_a in link_attrs:
+                        str_src_ids, str_trg_ids = link_a['xtargets'].split(';')
+                        src_ids = str_src_ids.split()
+                        trg_ids = str_trg_ids.split()
+                        src_sentences, src_attrs = src_parser.read_sentence(
+                                src_ids)
+                        trg_sentences, trg_attrs = trg_parser.read_sentence(
+                                trg_ids)
+                        if self.pair_reader.check_filters(src_attrs, trg_attrs):
+                            continue
+
+                        if self.switch_langs:
+                            yield SentencePair(trg_doc_name, src_doc_name,
+                                    tuple(trg_ids), tuple(src_ids),
+                                    ' '.join(trg_sentences),
+                                    ' '.join(src_sentences), link_a)
+                        else:
+                            yield SentencePair(src_doc_name, trg_doc_name,
+                                    tuple(src_ids), tuple(trg_ids),
+                                    ' '.join(src_sentences),
+                                    ' '.join(trg_sentences), link_a)
+
+                        total += 1
+                        if total == self.maximum:
+                            return
+                except SentenceParserError as e:
+                    self.print_error(e.message)
+                finally:
+                    if stream:
+                        src_parser.close_document()
+                        trg_parser.close_document()
+        finally:
+            self.save_alignment_index()
+            self.alignmentParser.bp.close_document()
+            self.of_handler.close_zipfiles()
+
+    def print_pairs_parallel(self):
+        """Read and format document pairs in worker processes and output
+        them in the original order"""
+
+        total = self.resumed_total
+        if self.resumed and total == self.maximum:
+            return None
+
+        doc_pairs = self.doc_pairs()
+        first_pair = next(doc_pairs, None)
+        if first_pair is None:
+            return self.doc_pairs_read, total
+        if (self.of_handler.needs_zipfiles(first_pair[3]) or
+                self.of_handler.needs_zipfiles(first_pair[4])):
+            #Find or download the zip files before starting the workers
+            self.flush_output()
+            self.of_handler.open_zipfiles()
+
+        pending = deque()
+        with ProcessPoolExecutor(max_workers=self.workers,
+                initializer=init_worker,
+                initargs=(pickle.dumps(self.pair_reader),)) as executor:
+            for doc_pair in chain([first_pair], doc_pairs):
+                #Document pairs are read ahead, their numbers are kept
+                #for the checkpoints. At most maximum-total sentence
+                #pairs are needed from a document pair.
+                limit = self.maximum - total if self.maximum >= 0 else -1
+                pending.append((doc_pair[3], doc_pair[4], executor.submit(
+                    format_doc_pair_in_worker,
+                    doc_pair + (self.stream, limit)),
+                    self.doc_pairs_read-1))
+                if len(pending) < 2*self.workers:
+                    continue
+                total = self.print_doc_pair(*pending.popleft(), total)
+                if total == self.maximum:
+                    break
+            while pending and total != self.maximum:
+                total = self.print_doc_pair(*pending.popleft(), total)
+            for doc_pair in pending:
+                doc_pair[2].cancel()
+
+        if total == self.maximum:
+            return None
+        return self.doc_pairs_read, total
+
+    def print_doc_pair(self, src_doc_name, trg_doc_name, future, doc_pair,
+            total):
+        """Output a document pair formatted by a worker process"""
+        messages, message, results = future.result()
+        #The output of the previous document pairs is complete, see
+        #print_pairs_serial
+        self.save_checkpoint(doc_pair, total,
+                force=0 < self.maximum - total <= len(results))
+        if messages:
+            self.flush_output()
+            print(messages, end='')
+        if message and not results:
+            self.print_error(message)
+            return total
+
+        self.add_doc_names(src_doc_name, trg_doc_name,
+                self.resultfile, self.mosessrc, self.mosestrg)
+        for src_result, trg_result, link_a in results:
+            self.out_put_pair(src_result, trg_result, self.resultfile,
+                    self.mosessrc, self.mosestrg, link_a, self.id_file,
+                    src_doc_name, trg_doc_name)
+            total += 1
+            if total == self.maximum:
+                break
+        self.add_doc_ending(self.resultfile)
+        if message:
+            self.print_error(message)
+        return total
 
@@ -0,0 +1,313 @@
+import os
+import marshal
+import xml.parsers.expat
+
+from .block_parser import CHUNK_SIZE, read_chunks
+from ..util import file_open, get_file_id
+
+try:
+    import indexed_gzip
+except ImportError:
+    indexed_gzip = None
+
+#Index files are looked for next to the alignment files
+INDEX_SUFFIX = '.lgidx'
+#Restart points of gzip files, written and read by indexed_gzip
+GZIP_INDEX_SUFFIX = '.gzidx'
+INDEX_VERSION = 2
+
+class AlignmentIndexError(Exception):
+
+    def __init__(self, message):
+        """Raise error when an alignment file cannot be indexed or the
+        document pair to start from is not found.
+
+        Arguments:
+        message -- Error message to be printed
+        """
+        self.message = message
+
+def find_doc_pair(doc_pairs, start):
+    """Return the number of the linkGrp to start reading from.
+
+    Positional arguments:
+    doc_pairs -- List of linkGrp entries that start with the fromDoc and
+        toDoc names
+    start -- Number of the linkGrp counting from 0, or its fromDoc name
+    """
+    if isinstance(start, str) and start.isdigit():
+        start = int(start)
+    if isinstance(start, int):
+        if not 0 <= start <= len(doc_pairs):
+            raise AlignmentIndexError('Document pair number {} is out of '
+                'range, the alignment file has {} document pairs'.format(
+                    start, len(doc_pairs)))
+        return start
+    for i, entry in enumerate(doc_pairs):
+        if entry[0] == start:
+            return i
+    raise AlignmentIndexError('No document pair with the source document '
+        '"{}" in the alignment file'.format(start))
+
+class PrefixedDocument:
+
+    def __init__(self, prefix, document, name):
+        """Read prefix bytes followed by the rest of a document.
+
+        Positional arguments:
+        prefix -- Bytes returned before the document
+        document -- File opened in binary mode
+        name -- Name of the document used in error messages
+        """
+        self.prefix = prefix
+        self.document = document
+        self.name = name
+
+    def read(self, size=-1):
+        if not self.prefix:
+            return self.document.read(size)
+        if size < 0:
+            data, self.prefix = self.prefix+self.document.read(), b''
+        else:
+            data, self.prefix = self.prefix[:size], self.prefix[size:]
+        return data
+
+    def close(self):
+        self.document.close()
+
+class AlignmentIndex:
+
+    def __init__(self, alignment_name, index_name=None, build=True):
+        """Index of the positions of the linkGrps in an alignment file.
+
+        The index stores the offset of each linkGrp in the uncompressed
+        alignment file and the part of the file before the first linkGrp,
+        so that reading can start at any document pair. The index is
+        stored next to the alignment file and built again if the
+        alignment file changes. If the index file cannot be written, the
+        index is kept in memory only.
+
+        The index can also be stored while the alignment file is read
+        for output, see open_at and update. A run that stops before the
+        end of the file stores a partial index, which is used for
+        starting from the document pairs it contains.
+
+        If indexed_gzip is installed, the restart points of gzip files
+        are stored as well, and the part of the file before the starting
+        document pair is not decompressed. Otherwise it is decompressed
+        but not parsed. The size and modification time of the restart
+        point file are stored in the index, and a restart point file
+        that does not match them is not used.
+
+        Positional arguments:
+        alignment_name -- Path of the alignment file
+
+        Keyword arguments:
+        index_name -- Path of the index file (default: alignment file
+            path with ".lgidx" appended)
+        build -- Build the index by parsing the whole alignment file if
+            there is no stored index (default True)
+        """
+        self.alignment_name = alignment_name
+        if index_name is None:
+            index_name = alignment_name + INDEX_SUFFIX
+        self.index_name = index_name
+        self.gzip_index_name = alignment_name + GZIP_INDEX_SUFFIX
+        self.seekable_gzip = (indexed_gzip is not None and
+                alignment_name.endswith('.gz'))
+        self.file_id = get_file_id(alignment_name)
+        self.header = b''
+        self.doc_pairs = []
+        #Offset of the end of the linkGrps, None if the index is partial
+        self.end = None
+        #File id of the restart point file written with the index
+        self.gzip_index_id = None
+        #Number of the linkGrp where the file opened by open_at starts,
+        #and the difference between offsets in the file and in the bytes
+        #read from it
+        self.start = 0
+        self.shift = 0
+        self.document = None
+        if not self.load() and build:
+            self.build()
+
+    def load(self):
+        """Load the index, return False if there is no up to date index"""
+        try:
+            with open(self.index_name, 'rb') as f:
+                data = marshal.load(f)
+        except (OSError, EOFError, ValueError, TypeError):
+            return False
+        if (not isinstance(data, dict) or
+                data.get('version') != INDEX_VERSION or
+                data.get('file_id') != self.file_id):
+            return False
+        self.header = data['header']
+        self.gzip_index_id = data['gzip_index_id']
+        self.doc_pairs = data['doc_pairs']
+        self.end = data['end']
+        return True
+
+    def is_complete(self):
+        return self.end is not None
+
+    def covers(self, start_doc_pair=None, shard=None):
+        """Check if reading can start from a document pair without
+        building the index. Sharding needs a complete index."""
+        if self.is_complete():
+            return True
+        if shard is not None:
+            return False
+        try:
+            return (find_doc_pair(self.doc_pairs, start_doc_pair) <
+                    len(self.doc_pairs))
+        except AlignmentIndexError:
+            return False
+
+    def has_gzip_index(self):
+        """Check if the restart point file is the one written with the
+        index"""
+        try:
+            return (self.gzip_index_id is not None and
+                    get_file_id(self.gzip_index_name) == self.gzip_index_id)
+        except OSError:
+            return False
+
+    def open_file(self, import_gzip_index=True):
+        """Open the alignment file in binary mode. The restart points
+        of a gzip file are imported if they are up to date."""
+        if self.seekable_gzip:
+            document = indexed_gzip.IndexedGzipFile(self.alignment_name)
+            if import_gzip_index and self.has_gzip_index():
+                document.import_index(self.gzip_index_name)
+            return document
+        return file_open(self.alignment_name, mode='rb')
+
+    def export_gzip_index(self, document):
+        """Write the restart points of a gzip file read with
+        indexed_gzip and store the id of the restart point file"""
+        self.gzip_index_id = None
+        try:
+            document.export_index(self.gzip_index_name)
+            self.gzip_index_id = get_file_id(self.gzip_index_name)
+        except OSError:
+            pass
+
+    def build(self):
+        """Find the offsets of the linkGrps and store the index"""
+        doc_pairs = []
+        end = None
+        parser = xml.parsers.expat.ParserCreate()
+
+        def start_element(name, attrs):
+            if name == 'linkGrp':
+                doc_pairs.append((attrs.get('fromDoc'), attrs.get('toDoc'),
+                    parser.CurrentByteIndex))
+
+        def end_element(name):
+            nonlocal end
+            if name == 'cesAlign':
+                end = parser.CurrentByteIndex
+
+        parser.StartElementHandler = start_element
+        parser.EndElementHandler = end_element
+
+        #Restart points of an earlier version of the file are not used
+        document = self.open_file(import_gzip_index=False)
+        try:
+            size = 0
+            for chunk in read_chunks(document, CHUNK_SIZE):
+                size += len(chunk)
+                parser.Parse(chunk)
+            if self.seekable_gzip:
+                self.export_gzip_index(document)
+        except xml.parsers.expat.ExpatError as e:
+            raise AlignmentIndexError(
+                'Error while indexing alignment file: {error}'.format(
+                    error=e.args[0]))
+        finally:
+            document.close()
+
+        if end is None:
+            end = size
+        header_size = doc_pairs[0][2] if doc_pairs else end
+        self.header = self.read_header(header_size)
+        self.doc_pairs = doc_pairs
+        self.end = end
+        self.save()
+
+    def read_header(self, header_size):
+        """Return the part of the file before the first linkGrp"""
+        with file_open(self.alignment_name, mode='rb') as document:
+            return document.read(header_size)
+
+    def save(self):
+        """Write the index file, or keep the index in memory only if the
+        file cannot be written"""
+        data = {'version': INDEX_VERSION, 'file_id': self.file_id,
+                'header': self.header, 'doc_pairs': self.doc_pairs,
+                'end': self.end, 'gzip_index_id': self.gzip_index_id}
+        temp_name = '{}.{}.tmp'.format(self.index_name, os.getpid())
+        try:
+            with open(temp_name, 'wb') as f:
+                marshal.dump(data, f)
+            os.replace(temp_name, self.index_name)
+        except OSError:
+            #The alignment file may be in a read-only directory, e.g. a
+            #shared OPUS root. The index is then only used for this run.
+            pass
+        finally:
+            if os.path.isfile(temp_name):
+                os.remove(temp_name)
+
+    def open_at(self, start):
+        """Open the alignment file for reading from a document pair. The
+        part before the first linkGrp is read first.
+
+        Positional arguments:
+        start -- Number of the linkGrp counting from 0, or its fromDoc name
+        """
+        group_num = find_doc_pair(self.doc_pairs, start)
+        document = self.open_file()
+        self.start = group_num
+        self.document = document
+        #The document is wrapped also when reading from the beginning,
+        #because files opened with indexed_gzip have no name
+        if group_num == 0:
+            self.shift = 0
+            return PrefixedDocument(b'', document, self.alignment_name)
+        if group_num < len(self.doc_pairs):
+            offset = self.doc_pairs[group_num][2]
+        else:
+            offset = self.end
+        document.seek(offset)
+        self.shift = offset - len(self.header)
+        return PrefixedDocument(self.header, document, self.alignment_name)
+
+    def update(self, group_offsets, end_offset):
+        """Add the linkGrps found while reading the file opened with
+        open_at to a partial index and store it. The restart points of a
+        gzip file read with indexed_gzip are stored as well.
+
+        Positional arguments:
+        group_offsets -- (fromDoc, toDoc, offset) entries of the linkGrps
+            that have been read, with the offsets in the bytes read
+        end_offset -- Offset of the cesAlign end tag in the bytes read,
+            or None if it has not been read
+        """
+        if self.is_complete():
+            return
+        doc_pairs = self.doc_pairs[:self.start] + [
+                (from_doc, to_doc, offset+self.shift)
+                for from_doc, to_doc, offset in group_offsets]
+        if len(doc_pairs) <= len(self.doc_pairs) and end_offset is None:
+            return
+        if not self.header:
+            header_size = doc_pairs[0][2] if doc_pairs else end_offset
+            self.header = self.read_header(header_size)
+        self.doc_pairs = doc_pairs
+        if end_offset is not None:
+            self.end = end_offset + self.shift
+        if hasattr(self.document, 'export_index'):
+            self.export_gzip_index(self.document)
+        self.save()
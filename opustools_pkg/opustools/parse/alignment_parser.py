@@ -1,4 +1,8 @@
-from .block_parser import BlockParser, BlockParserError
+from collections import deque
+
+from .block_parser import BlockParserError, CHUNK_SIZE
+from .link_parser import LinkParser
+from .compiled_alignment import CompiledAlignment
 
 class AlignmentParserError(Exception):
 
@@ -10,104 +14,129 @@ class AlignmentParserError(Exception):
         """
         self.message = message
 
-def range_filter_type(src_range, trg_range):
-    def range_filter(*args):
-        """Flag if number of ids is outside given ranges"""
-
-        #args = (s_id, t_id, link_attr)
-        if src_range != 'all':
-            if len(args[0]) not in src_range:
-                return True
-        if trg_range != 'all':
-            if len(args[1]) not in trg_range:
-                return True
-        return False
-    return range_filter
-
-def attribute_filter_type(attribute, threshold):
-    def attribute_filter(*args):
-        """Flag if attribute score doesn't cross threshold"""
-
-        #args = (s_id, t_id, link_attr)
-        if attribute not in args[2].keys():
-            #if attribute is not included in link_attr, should this return True or False?
-            return True
-        if float(args[2][attribute]) < threshold:
-            return True
-        return False
-    return attribute_filter
-
-def non_alignment_filter(*args):
-    """Flag if there are no source or target ids"""
-
-    #args = (s_id, t_id, link_attr)
-    if len(args[0]) == 0 or len(args[1]) == 0:
+def parse_range(id_range):
+    """Return the set of allowed id counts for a range like "1-2", or
+    "all" if all counts are allowed"""
+    nums = id_range.split('-')
+    if nums[0].isnumeric():
+        return {i for i in range(int(nums[0]), int(nums[-1])+1)}
+    return id_range
+
+def link_filter_type(src_range, trg_range, attribute, threshold,
+        leave_non_alignments_out):
+    """Select function that checks all link filters at once, or None if
+    no links are filtered
+
+    Positional arguments:
+    src_range -- Allowed numbers of source ids, or "all"
+    trg_range -- Allowed numbers of target ids, or "all"
+    attribute -- Attribute whose score is compared to threshold, or None
+    threshold -- Minimum attribute score as a float
+    leave_non_alignments_out -- Filter links without source or target ids
+    """
+
+    check_src = src_range != 'all'
+    check_trg = trg_range != 'all'
+    check_attr = attribute is not None
+
+    def keep_link(s_id, t_id, link_attr):
+        """Check if link passes the range, attribute and non-alignment
+        filters"""
+        if check_src and len(s_id) not in src_range:
+            return False
+        if check_trg and len(t_id) not in trg_range:
+            return False
+        if check_attr:
+            score = link_attr.get(attribute)
+            #Links without the attribute are filtered
+            if score is None or float(score) < threshold:
+                return False
+        if leave_non_alignments_out and not (s_id and t_id):
+            return False
         return True
-    return False
+
+    def keep_ranges(s_id, t_id, link_attr):
+        """Check if numbers of ids are inside given ranges"""
+        return ((not check_src or len(s_id) in src_range) and
+                (not check_trg or len(t_id) in trg_range))
+
+    def keep_alignments(s_id, t_id, link_attr):
+        """Check if there are source and target ids"""
+        return bool(s_id and t_id)
+
+    if not (check_src or check_trg or check_attr or leave_non_alignments_out):
+        return None
+    if not (check_attr or leave_non_alignments_out):
+        return keep_ranges
+    if not (check_src or check_trg or check_attr):
+        return keep_alignments
+    return keep_link
 
 
 class AlignmentParser:
 
     def __init__(self, alignment_file, src_trg_range=('all', 'all'),
-            attr=None, thres=None, leave_non_alignments_out=False):
-        """Parse xces alignment files and output sentence ids."""
+            attr=None, thres=None, leave_non_alignments_out=False,
+            chunk_size=CHUNK_SIZE):
+        """Parse xces alignment files and output sentence ids.
 
-        self.bp = BlockParser(alignment_file)
-        self.filters = []
+        alignment_file can also be a CompiledAlignment, whose link
+        records are used without parsing.
+        """
 
+        if isinstance(alignment_file, CompiledAlignment):
+            self.bp = alignment_file
+        else:
+            self.bp = LinkParser(alignment_file, chunk_size=chunk_size)
+        #LinkGrps that were parsed after the previously returned linkGrp
+        self.link_groups = deque()
         src_range, trg_range = src_trg_range
         if src_trg_range != ('all', 'all'):
-            nums = src_range.split('-')
-            if nums[0].isnumeric():
-                src_range = {i for i in range(int(nums[0]), int(nums[-1])+1)}
-            nums = trg_range.split('-')
-            if nums[0].isnumeric():
-                trg_range = {i for i in range(int(nums[0]), int(nums[-1])+1)}
-            self.filters.append(range_filter_type(src_range, trg_range))
+            src_range = parse_range(src_range)
+            trg_range = parse_range(trg_range)
 
-        if attr and thres:
-            self.filters.append(attribute_filter_type(attr, float(thres)))
+        if not (attr and thres):
+            attr, thres = None, None
+        else:
+            thres = float(thres)
 
-        if leave_non_alignments_out:
-            self.filters.append(non_alignment_filter)
+        self.link_filter = link_filter_type(src_range, trg_range, attr, thres,
+                leave_non_alignments_out)
 
-    def add_link(self, link, attrs, src_id_set, trg_id_set):
-        """Add link to set of links to be returned"""
-        ids = link.attributes['xtargets'].split(';')
-        s_id = ids[0].split()
-        t_id = ids[1].split()
+    def collect_link_records(self):
+        """Collect the link records of a linkGrp
 
-        for f in self.filters:
-            if f(s_id, t_id, link.attributes):
-                return attrs, src_id_set, trg_id_set
-
-        attrs.append(link.attributes)
-        src_id_set.update(s_id)
-        trg_id_set.update(t_id)
+        Returns a list of (source ids, target ids, attributes) records
+        that pass the filters, the sets of source and target ids in the
+        records, and the names of the source and target documents. The
+        document names are None at the end of the alignment file.
+        """
+        try:
+            if not self.link_groups:
+                self.link_groups.extend(self.bp.get_link_groups() or [])
+        except BlockParserError as e:
+            raise AlignmentParserError(
+                'Error while parsing alignment file: {error}'.format(error=e.args[0]))
 
-        return attrs, src_id_set, trg_id_set
+        if self.link_groups:
+            src_doc, trg_doc, links = self.link_groups.popleft()
+        else:
+            src_doc, trg_doc, links = None, None, self.bp.get_remaining_links()
 
-    def collect_links(self):
-        """Collect links for a linkGrp"""
+        link_filter = self.link_filter
+        if link_filter:
+            links = [link for link in links if link_filter(*link)]
 
-        attrs = []
         src_id_set, trg_id_set = set(), set()
-        src_doc, trg_doc = None, None
+        for s_id, t_id, _ in links:
+            src_id_set.update(s_id)
+            trg_id_set.update(t_id)
 
-        try:
-            blocks = self.bp.get_complete_blocks()
-            while blocks:
-                for block in blocks:
-                    if block.name == 'link':
-                        self.add_link(block, attrs, src_id_set, trg_id_set)
-                    elif block.name == 'linkGrp':
-                        src_doc = block.attributes['fromDoc']
-                        trg_doc = block.attributes['toDoc']
-                        return attrs, src_id_set, trg_id_set, src_doc, trg_doc
-                blocks = self.bp.get_complete_blocks()
-        except BlockParserError as e:
-            raise AlignmentParserError(
-                'Error while parsing alignment file: {error}'.format(error=e.args[0]))
+        return links, src_id_set, trg_id_set, src_doc, trg_doc
 
+    def collect_links(self):
+        """Collect links for a linkGrp"""
+        links, src_id_set, trg_id_set, src_doc, trg_doc = \
+                self.collect_link_records()
+        attrs = [link[2] for link in links]
         return attrs, src_id_set, trg_id_set, src_doc, trg_doc
-
@@ -1,6 +1,11 @@
 import xml.parsers.expat
 from ..util import file_open
 
+CHUNK_SIZE = 1024*1024
+
+#Tag and attribute names shared by all parsers
+NAMES = {}
+
 class BlockParserError(Exception):
 
     def __init__(self, message):
@@ -13,12 +18,22 @@ class BlockParserError(Exception):
 
 class Block:
 
-    def __init__(self, parent=None, name=None, data='', attributes=None):
-        """Xml block instance held in memory by BlockParser"""
+    __slots__ = ('parent', 'name', 'data', 'attributes', 'sentence')
+
+    def __init__(self, parent=None, name=None, data='', attributes=None,
+            sentence=None):
+        """Xml block instance held in memory by BlockParser
+
+        While the block is open, the character data of a data tag block
+        is collected into a list, which is joined into a string when the
+        end tag is found. sentence is the block of the enclosing <s>
+        element, or None if the block is not inside a sentence.
+        """
         self.parent = parent
         self.name = name
         self.data = data
         self.attributes = attributes
+        self.sentence = sentence
 
     def get_raw_tag(self):
         astrings = ['{k}="{v}"'.format(k=k, v=v)
@@ -39,43 +54,99 @@ class Block:
             'parent: {parent}'.format(name=self.name, data=repr(self.data),
                 attributes=self.attributes, parent=parent_name))
 
+def read_chunks(document, chunk_size):
+    """Read a document in chunks of chunk_size bytes (or characters, if
+    the document is opened in text mode)"""
+    chunk = document.read(chunk_size)
+    while chunk:
+        yield chunk
+        chunk = document.read(chunk_size)
+
 class BlockParser:
 
-    def __init__(self, document, data_tag=None):
+    def __init__(self, document, data_tag=None, chunk_size=None,
+            id_set=None):
         """Parse an xml document line by line removing each element
         from memory as soon as its end tag is found.
 
         Positional arguments:
         document -- Xml document to be parsed
         data_tag -- Tag for which char data is updated
+        chunk_size -- Feed the document to the parser in chunks of this
+            size instead of line by line (default None)
+        id_set -- Skip sentences (<s> elements) whose id is not in this
+            set without creating blocks for them or their contents
+            (default None, keep all sentences)
         """
 
         self.document = document
         self.data_tag = data_tag
+        self.id_set = id_set
         self.block = Block(name='root')
+        #Block of the sentence that is currently open
+        self.sentence = None
         self.completeBlocks = []
+        self.skip_depth = 0
+
+        if chunk_size:
+            self.chunks = read_chunks(document, chunk_size)
+        else:
+            self.chunks = document
 
         def start_element(name, attrs):
             """Update current block"""
-            sub_block = Block(parent=self.block, name=name, attributes=attrs)
-            self.block = sub_block
+            if (name == 's' and self.id_set is not None and
+                    attrs.get('id') not in self.id_set):
+                self.start_skipping()
+                return
+            if name == data_tag:
+                self.block = Block(self.block, name, [], attrs, self.sentence)
+            else:
+                self.block = Block(self.block, name, '', attrs, self.sentence)
+            if name == 's':
+                self.sentence = self.block
 
         def end_element(name):
             """Update complete blocks, and move up one level on block tree"""
-            self.completeBlocks.append(self.block)
-            self.block = self.block.parent
+            block = self.block
+            if name == data_tag:
+                block.data = ''.join(block.data)
+            if name == 's':
+                self.sentence = block.sentence
+            self.completeBlocks.append(block)
+            self.block = block.parent
 
         def char_data(data):
             """Update current block's character data"""
-            if self.block.name == self.data_tag:
-                self.block.data += data
+            if self.block.name == data_tag:
+                self.block.data.append(data)
+
+        def skip_start_element(name, attrs):
+            """Go down one level inside a skipped sentence"""
+            self.skip_depth += 1
+
+        def skip_end_element(name):
+            """Go up one level, and stop skipping at the sentence end tag"""
+            if self.skip_depth == 0:
+                self.set_handlers(self.handlers)
+            else:
+                self.skip_depth -= 1
+
+        self.handlers = (start_element, end_element,
+                char_data if data_tag else None)
+        self.skip_handlers = (skip_start_element, skip_end_element, None)
+
+        self.p = xml.parsers.expat.ParserCreate(intern=NAMES)
+        self.set_handlers(self.handlers)
 
-        self.p = xml.parsers.expat.ParserCreate()
+    def set_handlers(self, handlers):
+        (self.p.StartElementHandler, self.p.EndElementHandler,
+                self.p.CharacterDataHandler) = handlers
 
-        self.p.StartElementHandler = start_element
-        self.p.EndElementHandler = end_element
-        if data_tag:
-            self.p.CharacterDataHandler = char_data
+    def start_skipping(self):
+        """Ignore everything until the end tag of the current element"""
+        self.skip_depth = 0
+        self.set_handlers(self.skip_handlers)
 
     def parse_line(self, line):
         try:
@@ -91,10 +162,11 @@ class BlockParser:
 
     def get_complete_blocks(self):
         """
-        Read lines until one or more end tags are found on a single line,
-        and return the block trees corresponding to those end tags.
+        Read lines (or chunks) until one or more end tags are found on a
+        single line, and return the block trees corresponding to those
+        end tags.
         """
-        for line in self.document:
+        for line in self.chunks:
             self.parse_line(line)
             if len(self.completeBlocks) > 0:
                 ret_blocks = self.completeBlocks
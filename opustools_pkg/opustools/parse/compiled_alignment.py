@@ -0,0 +1,165 @@
+import os
+import mmap
+import struct
+import marshal
+
+from .block_parser import CHUNK_SIZE
+from .link_parser import LinkParser
+from ..util import get_file_id
+
+MAGIC = b'OPUSALN2'
+#Directory offset, directory length, size and modification time of the
+#alignment file that was compiled, and magic bytes at the end of the file
+FOOTER = struct.Struct('<QQQq8s')
+#Compiled alignment files are looked for next to the alignment files
+COMPILED_SUFFIX = '.bin'
+
+class CompiledAlignmentError(Exception):
+
+    def __init__(self, message):
+        """Raise error when a compiled alignment file cannot be read.
+
+        Arguments:
+        message -- Error message to be printed
+        """
+        self.message = message
+
+def compile_alignment(alignment_file, output_name, source_name=None,
+        chunk_size=CHUNK_SIZE):
+    """Convert an xces alignment file into a compiled alignment file.
+
+    The compiled file starts with MAGIC, followed by the marshalled link
+    records of each linkGrp, a marshalled directory of (fromDoc, toDoc,
+    offset, length, number of links) entries and a footer with the
+    position of the directory and the size and modification time of the
+    alignment file.
+
+    Positional arguments:
+    alignment_file -- Alignment file to be compiled
+    output_name -- Path of the compiled file
+
+    Keyword arguments:
+    source_name -- Path of the alignment file. The compiled file is used
+        in place of this file as long as the file does not change. If
+        not given, the compiled file is only used when it is read
+        directly.
+    chunk_size -- Size of the chunks fed to the xml parser
+    """
+    #A modification time of -1 does not match any alignment file
+    source_size, source_mtime = (get_file_id(source_name)
+            if source_name is not None else (0, -1))
+    lp = LinkParser(alignment_file, chunk_size=chunk_size)
+    directory = []
+    temp_name = '{}.{}.tmp'.format(output_name, os.getpid())
+    try:
+        with open(temp_name, 'wb') as output:
+            output.write(MAGIC)
+            offset = len(MAGIC)
+            groups = lp.get_link_groups()
+            while groups:
+                for from_doc, to_doc, links in groups:
+                    data = marshal.dumps([(s_id, t_id, dict(attrs))
+                        for s_id, t_id, attrs in links])
+                    output.write(data)
+                    directory.append((from_doc, to_doc, offset, len(data),
+                        len(links)))
+                    offset += len(data)
+                groups = lp.get_link_groups()
+            data = marshal.dumps(directory)
+            output.write(data)
+            output.write(FOOTER.pack(offset, len(data), source_size,
+                source_mtime, MAGIC))
+        os.replace(temp_name, output_name)
+    finally:
+        lp.close_document()
+        if os.path.isfile(temp_name):
+            os.remove(temp_name)
+    return directory
+
+def is_compiled(file_name):
+    """Check if a file is a compiled alignment file"""
+    with open(file_name, 'rb') as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+def read_source_id(file_name):
+    """Return the size and modification time of the alignment file that
+    a compiled alignment file was compiled from, or None if the file is
+    not a complete compiled alignment file"""
+    with open(file_name, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            return None
+        if f.seek(0, os.SEEK_END) < len(MAGIC) + FOOTER.size:
+            return None
+        f.seek(-FOOTER.size, os.SEEK_END)
+        dir_offset, dir_length, source_size, source_mtime, magic = \
+                FOOTER.unpack(f.read(FOOTER.size))
+    if magic != MAGIC:
+        return None
+    return (source_size, source_mtime)
+
+def find_compiled(alignment_name):
+    """Return the path of an up to date compiled version of an alignment
+    file, or None if there is none. A compiled file is up to date if the
+    size and modification time of the alignment file are the same as
+    when it was compiled."""
+    if is_compiled(alignment_name):
+        return alignment_name
+    compiled_name = alignment_name + COMPILED_SUFFIX
+    if (os.path.isfile(compiled_name) and
+            read_source_id(compiled_name) == get_file_id(alignment_name)):
+        return compiled_name
+    return None
+
+class CompiledAlignment:
+
+    def __init__(self, file_name):
+        """Read link records from a compiled alignment file.
+
+        The file is memory-mapped and the records of a linkGrp are loaded
+        only when the linkGrp is read. Works in place of a LinkParser in
+        AlignmentParser.
+
+        Positional arguments:
+        file_name -- Path of the compiled alignment file
+        """
+        self.name = file_name
+        self.document = open(file_name, 'rb')
+        self.mm = mmap.mmap(self.document.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if (len(self.mm) < len(MAGIC) + FOOTER.size or
+                self.mm[:len(MAGIC)] != MAGIC):
+            self.close_document()
+            raise CompiledAlignmentError(
+                "'{}' is not a compiled alignment file".format(file_name))
+        dir_offset, dir_length, source_size, source_mtime, magic = \
+                FOOTER.unpack(self.mm[-FOOTER.size:])
+        if magic != MAGIC:
+            self.close_document()
+            raise CompiledAlignmentError(
+                "Compiled alignment file '{}' is incomplete".format(file_name))
+        self.directory = marshal.loads(
+                self.mm[dir_offset:dir_offset+dir_length])
+        self.position = 0
+
+    def get_links(self, group_num):
+        """Return the link records of a linkGrp"""
+        from_doc, to_doc, offset, length, num_links = \
+                self.directory[group_num]
+        return marshal.loads(self.mm[offset:offset+length])
+
+    def get_link_groups(self):
+        """Return the next linkGrp as a (fromDoc, toDoc, link records)
+        tuple in a list, or None at the end of the file."""
+        if self.position >= len(self.directory):
+            return None
+        from_doc, to_doc = self.directory[self.position][:2]
+        links = self.get_links(self.position)
+        self.position += 1
+        return [(from_doc, to_doc, links)]
+
+    def get_remaining_links(self):
+        return []
+
+    def close_document(self):
+        self.mm.close()
+        self.document.close()
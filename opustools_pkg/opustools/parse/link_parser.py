@@ -0,0 +1,95 @@
+import xml.parsers.expat
+
+from .block_parser import BlockParserError, NAMES, read_chunks
+
+class LinkParser:
+
+    def __init__(self, document, chunk_size=None):
+        """Parse the links of an xces alignment file without building
+        blocks for the xml elements.
+
+        Each link is stored as a record (source ids, target ids,
+        attributes), where the ids are tuples of the sentence ids in the
+        xtargets attribute and attributes is the attribute dictionary of
+        the link. The records are returned in batches, one batch per
+        linkGrp. The byte offsets of the linkGrps and of the end of the
+        cesAlign element are recorded for storing an AlignmentIndex.
+
+        Positional arguments:
+        document -- Alignment file to be parsed
+        chunk_size -- Feed the document to the parser in chunks of this
+            size instead of line by line (default None)
+        """
+
+        self.document = document
+        self.links = []
+        self.from_doc = None
+        self.to_doc = None
+        self.complete_groups = []
+        #(fromDoc, toDoc, offset) of each linkGrp in the parsed bytes
+        self.group_offsets = []
+        #Offset of the cesAlign end tag, None until it is parsed
+        self.end_offset = None
+
+        if chunk_size:
+            self.chunks = read_chunks(document, chunk_size)
+        else:
+            self.chunks = document
+
+        links = self.links
+        group_offsets = self.group_offsets
+
+        def start_element(name, attrs):
+            """Store link records and the document names of linkGrps"""
+            if name == 'link':
+                src_ids, _, trg_ids = attrs['xtargets'].partition(';')
+                links.append((tuple(src_ids.split()), tuple(trg_ids.split()),
+                    attrs))
+            elif name == 'linkGrp':
+                self.from_doc = attrs['fromDoc']
+                self.to_doc = attrs['toDoc']
+                group_offsets.append((self.from_doc, self.to_doc,
+                    self.p.CurrentByteIndex))
+
+        def end_element(name):
+            """Complete the current linkGrp"""
+            if name == 'linkGrp':
+                self.complete_groups.append((self.from_doc, self.to_doc,
+                    links[:]))
+                links.clear()
+            elif name == 'cesAlign':
+                self.end_offset = self.p.CurrentByteIndex
+
+        self.p = xml.parsers.expat.ParserCreate(intern=NAMES)
+        self.p.StartElementHandler = start_element
+        self.p.EndElementHandler = end_element
+
+    def parse_line(self, line):
+        try:
+            self.p.Parse(line)
+        except xml.parsers.expat.ExpatError as e:
+            self.close_document()
+            raise BlockParserError(
+                "Document '{document}' could not be parsed: "
+                "{error}".format(document=self.document.name, error=e.args[0]))
+
+    def close_document(self):
+        self.document.close()
+
+    def get_link_groups(self):
+        """Read lines (or chunks) until one or more linkGrps have been
+        completed, and return them as (fromDoc, toDoc, link records)
+        tuples. Return None at the end of the document."""
+        for line in self.chunks:
+            self.parse_line(line)
+            if self.complete_groups:
+                groups = self.complete_groups
+                self.complete_groups = []
+                return groups
+
+    def get_remaining_links(self):
+        """Return the link records that are not inside a complete
+        linkGrp"""
+        links = self.links[:]
+        self.links.clear()
+        return links
@@ -0,0 +1,152 @@
+import os
+import pickle
+import hashlib
+from collections import OrderedDict
+
+class SentenceCache:
+
+    def __init__(self, cache_dir, max_size=1000*1024*1024):
+        """Cache of parsed sentence files stored on disk.
+
+        Each parsed sentence file is stored in its own file in cache_dir.
+        When the total size of the cache files exceeds max_size, the least
+        recently used files are removed. The total size is found from
+        cache_dir when the first file is saved and kept up to date after
+        that, so the directory is read again only when it is too large.
+
+        Positional arguments:
+        cache_dir -- Directory where the cache files are stored
+
+        Keyword arguments:
+        max_size -- Maximum total size of the cache files in bytes
+        """
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        #Total size of the cache files, None until cache_dir is read
+        self.total_size = None
+
+    def get_path(self, key):
+        name = hashlib.sha1(repr(key).encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, name+'.pickle')
+
+    def load(self, key):
+        """Return the sentences stored with key, or None if they are not
+        in the cache."""
+        path = self.get_path(key)
+        try:
+            with open(path, 'rb') as cache_file:
+                sentences = pickle.load(cache_file)
+            #The modification time tells when the file was last used
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        except (pickle.UnpicklingError, EOFError, OSError):
+            return None
+        return sentences
+
+    def save(self, key, sentences):
+        """Store sentences with key and remove the least recently used
+        cache files if the cache has grown too large."""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self.get_path(key)
+        temp_path = '{}.{}.tmp'.format(path, os.getpid())
+        with open(temp_path, 'wb') as cache_file:
+            pickle.dump(sentences, cache_file, pickle.HIGHEST_PROTOCOL)
+            size = cache_file.tell()
+        try:
+            old_size = os.stat(path).st_size
+        except FileNotFoundError:
+            old_size = 0
+        os.replace(temp_path, path)
+        if self.total_size is None:
+            self.evict()
+        else:
+            self.total_size += size - old_size
+            if self.total_size > self.max_size:
+                self.evict()
+
+    def evict(self):
+        """Read the sizes of the cache files and remove the least
+        recently used files until the cache is small enough"""
+        entries = []
+        with os.scandir(self.cache_dir) as cache_files:
+            for entry in cache_files:
+                if entry.name.endswith('.pickle'):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for mtime, size, path in entries)
+        entries.sort()
+        for mtime, size, path in entries:
+            if total <= self.max_size:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+        self.total_size = total
+
+def estimate_size(sentences):
+    """Return the approximate number of bytes taken by parsed sentences"""
+    size = 0
+    for sid, (sentence, attributes) in sentences.items():
+        size += 200 + len(sid) + len(sentence)
+        for name, value in attributes.items():
+            size += 100 + len(name) + len(value)
+    return size
+
+class MemorySentenceCache:
+
+    def __init__(self, max_documents=None, max_size=None, next_cache=None):
+        """Cache of parsed sentence files kept in memory.
+
+        When the cache holds more than max_documents documents or more
+        than max_size bytes of sentences, the least recently used
+        documents are removed.
+
+        Keyword arguments:
+        max_documents -- Maximum number of documents in the cache
+        max_size -- Maximum approximate size of the documents in bytes
+        next_cache -- Cache that is used when a document is not in memory,
+            e.g. a SentenceCache
+        """
+        self.max_documents = max_documents
+        self.max_size = max_size
+        self.next_cache = next_cache
+
+        self.documents = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+
+    def load(self, key):
+        """Return the sentences stored with key, or None if they are not
+        in the cache."""
+        if key in self.documents:
+            self.hits += 1
+            self.documents.move_to_end(key)
+            return self.documents[key][0]
+        self.misses += 1
+        if self.next_cache is not None:
+            sentences = self.next_cache.load(key)
+            if sentences is not None:
+                self.store(key, sentences)
+            return sentences
+        return None
+
+    def save(self, key, sentences):
+        self.store(key, sentences)
+        if self.next_cache is not None:
+            self.next_cache.save(key, sentences)
+
+    def store(self, key, sentences):
+        size = estimate_size(sentences)
+        if key in self.documents:
+            self.size -= self.documents.pop(key)[1]
+        self.documents[key] = (sentences, size)
+        self.size += size
+        while self.documents and (
+                (self.max_documents is not None and
+                    len(self.documents) > self.max_documents) or
+                (self.max_size is not None and self.size > self.max_size)):
+            self.size -= self.documents.popitem(last=False)[1][1]
@@ -0,0 +1,162 @@
+import io
+import sqlite3
+import xml.parsers.expat
+
+class SentenceIndexError(Exception):
+
+    def __init__(self, message):
+        """Raise error when a sentence file cannot be indexed.
+
+        Arguments:
+        message -- Error message to be printed
+        """
+        self.message = message
+
+def find_sentence_offsets(data):
+    """Return the byte offset and length of each sentence in an xml
+    document.
+
+    Positional arguments:
+    data -- Contents of the xml document as bytes
+    """
+    offsets = {}
+    starts = []
+    parser = xml.parsers.expat.ParserCreate()
+
+    def start_element(name, attrs):
+        if name == 's':
+            starts.append((parser.CurrentByteIndex, attrs.get('id')))
+
+    def end_element(name):
+        if name == 's':
+            start, sid = starts.pop()
+            end = data.index(b'>', parser.CurrentByteIndex) + 1
+            if sid is not None:
+                offsets[sid] = (start, end - start)
+
+    parser.StartElementHandler = start_element
+    parser.EndElementHandler = end_element
+    try:
+        #The end of the document is not checked, as is the case when
+        #sentence files are parsed
+        parser.Parse(data, False)
+    except xml.parsers.expat.ExpatError as e:
+        raise SentenceIndexError(
+            'Error while indexing sentence file: {error}'.format(
+                error=e.args[0]))
+    return offsets
+
+class SentenceIndex:
+
+    def __init__(self, zip_file, index_name=None):
+        """Index of the byte offsets of sentences in the xml documents of
+        a zip file.
+
+        The index is stored in an sqlite database next to the zip file,
+        or in memory if the database cannot be written. Each document is
+        indexed when it is read for the first time and indexed again if
+        it has changed in the zip file.
+
+        Positional arguments:
+        zip_file -- Opened zip file
+
+        Keyword arguments:
+        index_name -- Path of the index file (default: zip file path with
+            ".sidx" appended)
+        """
+        self.zip_file = zip_file
+        if index_name is None:
+            index_name = zip_file.filename + '.sidx'
+        self.index_name = index_name
+        try:
+            self.db = self.connect(index_name)
+        except sqlite3.Error:
+            #The zip file may be in a read-only directory, e.g. a shared
+            #OPUS root
+            self.db = self.connect(':memory:')
+
+    def connect(self, index_name):
+        db = sqlite3.connect(index_name, timeout=60)
+        try:
+            with db:
+                db.execute('CREATE TABLE IF NOT EXISTS documents '
+                    '(name TEXT PRIMARY KEY, crc INTEGER, size INTEGER)')
+                db.execute('CREATE TABLE IF NOT EXISTS sentences '
+                    '(document TEXT, sid TEXT, offset INTEGER, '
+                    'length INTEGER, PRIMARY KEY (document, sid)) '
+                    'WITHOUT ROWID')
+        except sqlite3.Error:
+            db.close()
+            raise
+        return db
+
+    def is_indexed(self, member):
+        """Check if a zip member has been indexed in its current form"""
+        info = self.zip_file.getinfo(member)
+        row = self.db.execute(
+            'SELECT crc, size FROM documents WHERE name = ?',
+            (member,)).fetchone()
+        return row == (info.CRC, info.file_size)
+
+    def index_document(self, member, data):
+        """Store the sentence offsets of a zip member and return them"""
+        info = self.zip_file.getinfo(member)
+        offsets = find_sentence_offsets(data)
+        try:
+            with self.db:
+                self.db.execute('DELETE FROM sentences WHERE document = ?',
+                    (member,))
+                self.db.executemany(
+                    'INSERT INTO sentences VALUES (?, ?, ?, ?)',
+                    ((member, sid, offset, length)
+                        for sid, (offset, length) in offsets.items()))
+                self.db.execute(
+                    'INSERT OR REPLACE INTO documents VALUES (?, ?, ?)',
+                    (member, info.CRC, info.file_size))
+        except sqlite3.Error:
+            #An existing index file may be readable but not writable
+            pass
+        return offsets
+
+    def get_offsets(self, member):
+        rows = self.db.execute(
+            'SELECT sid, offset, length FROM sentences WHERE document = ?',
+            (member,))
+        return {sid: (offset, length) for sid, offset, length in rows}
+
+    def open_sentences(self, member, id_set):
+        """Return a file object that contains only the sentences of a
+        zip member whose ids are in id_set.
+
+        The sentences are read by seeking to their offsets in the member,
+        and the member is indexed first if needed. Seeking in a compressed
+        member decompresses everything before the offset, so the index
+        saves reading time only for stored (uncompressed) members.
+        """
+        if self.is_indexed(member):
+            offsets = self.get_offsets(member)
+            data = None
+        else:
+            data = self.zip_file.read(member)
+            offsets = self.index_document(member, data)
+
+        spans = sorted(offsets[sid] for sid in id_set if sid in offsets)
+        parts = [b'<document>']
+        if data is None:
+            with self.zip_file.open(member, 'r') as doc:
+                for offset, length in spans:
+                    if offset < doc.tell():
+                        continue
+                    doc.seek(offset)
+                    parts.append(doc.read(length))
+        else:
+            parts.extend(data[offset:offset+length]
+                for offset, length in spans)
+        parts.append(b'</document>')
+
+        sentences = io.BytesIO(b''.join(parts))
+        sentences.name = member
+        return sentences
+
+    def close(self):
+        self.db.close()
@@ -1,4 +1,4 @@
-from .block_parser import BlockParser, BlockParserError
+from .block_parser import BlockParser, BlockParserError, CHUNK_SIZE
 
 class SentenceParserError(Exception):
 
@@ -11,7 +11,12 @@ class SentenceParserError(Exception):
         self.message = message
 
 def parse_type(preprocess, preserve, get_annotations):
-    """Select function to be used for parsing"""
+    """Select function to be used for parsing
+
+    Sentences that are not in the id set are skipped already by the
+    BlockParser, so all sentence blocks passed to these functions are
+    stored.
+    """
 
     def parse_s(block, sentence, sentences):
         sid = block.attributes['id']
@@ -28,70 +33,67 @@ def parse_type(preprocess, preserve, get_annotations):
         sentence = []
         return sentence
 
-    def parse_w(bp, block, sentence, id_set):
-        s_parent = bp.tag_in_parents('s', block)
-        if s_parent and s_parent.attributes['id'] in id_set:
+    def parse_w(block, sentence):
+        if block.sentence:
             data = block.data.strip()
             sentence.append(data)
         return sentence
 
-    def parse_w_parsed(bp, block, sentence, id_set):
-        s_parent = bp.tag_in_parents('s', block)
-        if s_parent and s_parent.attributes['id'] in id_set:
+    def parse_w_parsed(block, sentence):
+        if block.sentence:
             data = block.data.strip()
             data += get_annotations(block)
             sentence.append(data)
         return sentence
 
-    def parse_time(bp, block, sentence, id_set):
-        s_parent = bp.tag_in_parents('s', block)
-        if s_parent and s_parent.attributes['id'] in id_set:
+    def parse_time(block, sentence):
+        if block.sentence:
             sentence.append(block.get_raw_tag())
         return sentence
 
 
-    def xml(bp, block, sentence, sentences, id_set):
-        if block.name == 's' and block.attributes['id'] in id_set:
+    def xml(block, sentence, sentences):
+        if block.name == 's':
             sentence = parse_s(block, sentence, sentences)
         elif block.name == 'w':
-            sentence = parse_w(bp, block, sentence, id_set)
+            sentence = parse_w(block, sentence)
         return sentence
 
-    def raw(bp, block, sentence, sentences, id_set):
-        if block.name == 's' and block.attributes['id'] in id_set:
+    def raw(block, sentence, sentences):
+        if block.name == 's':
             sentence = parse_s_raw(block, sentence, sentences)
         return sentence
 
-    def parsed(bp, block, sentence, sentences, id_set):
-        if block.name == 's' and block.attributes['id'] in id_set:
+    def parsed(block, sentence, sentences):
+        if block.name == 's':
             sentence = parse_s(block, sentence, sentences)
         elif block.name == 'w':
-            sentence = parse_w_parsed(bp, block, sentence, id_set)
+            sentence = parse_w_parsed(block, sentence)
         return sentence
 
-    def xml_preserve(bp, block, sentence, sentences, id_set):
-        if block.name == 's' and block.attributes['id'] in id_set:
+    def xml_preserve(block, sentence, sentences):
+        if block.name == 's':
             sentence = parse_s(block, sentence, sentences)
         elif block.name == 'w':
-            sentence = parse_w(bp, block, sentence, id_set)
+            sentence = parse_w(block, sentence)
         elif block.name == 'time':
-            sentence = parse_time(bp, block, sentence, id_set)
+            sentence = parse_time(block, sentence)
         return sentence
 
-    def raw_preserve(bp, block, sentence, sentences, id_set):
-        if block.name == 's' and block.attributes['id'] in id_set:
+    def raw_preserve(block, sentence, sentences):
+        if block.name == 's':
             sentence = parse_s_raw(block, sentence, sentences)
         elif block.name == 'time':
-            sentence = parse_time(bp, block, sentence, id_set)
+            sentence = parse_time(block, sentence)
         return sentence
 
-    def parsed_preserve(bp, block, sentence, sentences, id_set):
-        if block.name == 's' and block.attributes['id'] in id_set:
+    def parsed_preserve(block, sentence, sentences):
+        if block.name == 's':
             sentence = parse_s(block, sentence, sentences)
         elif block.name == 'w':
-            sentence = parse_w_parsed(bp, block, sentence, id_set)
+            sentence = parse_w_parsed(block, sentence)
         elif block.name == 'time':
-            sentence = parse_time(bp, block, sentence, id_set)
+            sentence = parse_time(block, sentence)
         return sentence
 
     if preserve:
@@ -113,7 +115,8 @@ def parse_type(preprocess, preserve, get_annotations):
 class SentenceParser:
 
     def __init__(self, document, preprocessing=None, anno_attrs=['all_attrs'],
-            delimiter='|', preserve=None):
+            delimiter='|', preserve=None, chunk_size=CHUNK_SIZE,
+            cache=None, cache_key=None):
         """Parse xml sentence files that have sentence ids in any order.
 
         Arguments:
@@ -122,11 +125,15 @@ class SentenceParser:
         anno_attrs -- Which annotations will be printed
         delimiter -- Annotation attribute delimiter
         preserve -- Preserve inline tags
+        chunk_size -- Size of the chunks fed to the xml parser
+        cache -- SentenceCache where parsed documents are stored
+        cache_key -- Key that identifies the document in the cache
         """
 
         self.document = document
         self.delimiter = delimiter
         self.anno_attrs = anno_attrs
+        self.chunk_size = chunk_size
 
         self.parse_block = parse_type(preprocessing, preserve, self.get_annotations)
 
@@ -137,23 +144,80 @@ class SentenceParser:
         if preprocessing == 'raw':
             self.data_tag = 's'
 
-    def store_sentences(self, id_set):
-        """Read document and store sentences in a dictionary."""
-        bp = BlockParser(self.document, data_tag=self.data_tag)
-        sentence = []
-        sid = None
+        self.bp = None
+        self.partial_sentence = []
+        #How many times each sentence is still going to be read when
+        #sentences are streamed
+        self.id_counts = None
+
+        self.cache = cache
+        self.cache_key = None
+        if cache is not None and cache_key is not None:
+            #Parsed sentences depend also on the parsing settings
+            self.cache_key = (cache_key, preprocessing, tuple(anno_attrs),
+                    delimiter, bool(preserve))
+
+    def open_parser(self, id_set):
+        self.bp = BlockParser(self.document, data_tag=self.data_tag,
+                chunk_size=self.chunk_size, id_set=id_set)
+        self.partial_sentence = []
+
+    def parse_blocks(self, sid=None):
+        """Parse the document until sentence sid has been stored or, if
+        sid is None, until the end of the document."""
+        bp = self.bp
         try:
-            blocks = bp.get_complete_blocks()
-            while blocks:
-                for block in blocks:
-                    sentence = self.parse_block(
-                            bp, block, sentence, self.sentences, id_set)
+            while sid is None or sid not in self.sentences:
                 blocks = bp.get_complete_blocks()
-            bp.close_document()
+                if not blocks:
+                    self.done = True
+                    break
+                for block in blocks:
+                    self.partial_sentence = self.parse_block(block,
+                            self.partial_sentence, self.sentences)
         except BlockParserError as e:
+            self.done = True
             raise SentenceParserError(
                 'Error while parsing sentence file: {error}'.format(error=e.args[0]))
 
+    def store_sentences(self, id_set):
+        """Read document and store sentences in a dictionary.
+
+        Sentences whose id is not in id_set are skipped while parsing.
+        If id_set is None, all sentences are parsed. If the parser has a
+        cache, all sentences are parsed and stored in the cache, and they
+        are loaded from the cache instead of parsing when possible.
+        """
+        if self.cache_key is not None:
+            sentences = self.cache.load(self.cache_key)
+            if sentences is not None:
+                self.sentences = sentences
+                self.done = True
+                self.document.close()
+                return
+            id_set = None
+        self.open_parser(id_set)
+        self.parse_blocks()
+        self.bp.close_document()
+        if self.cache_key is not None:
+            self.cache.save(self.cache_key, self.sentences)
+
+    def stream_sentences(self, id_counts):
+        """Parse the document only as far as needed when sentences are
+        read, and remove sentences from memory once they have been read.
+
+        Arguments:
+        id_counts -- Number of times each sentence id will be read
+        """
+        self.id_counts = id_counts
+        self.open_parser(id_counts)
+
+    def close_document(self):
+        if self.bp:
+            self.bp.close_document()
+        else:
+            self.document.close()
+
     def get_annotations(self, block):
         annotations = ''
         if self.anno_attrs[0] == 'all_attrs':
@@ -169,11 +233,25 @@ class SentenceParser:
 
     def get_sentence(self, sid):
         """Return a sentence based on given sentence id."""
+        if self.id_counts is not None:
+            return self.get_streamed_sentence(sid)
         if sid in self.sentences.keys():
             return self.sentences[sid]
         else:
             return '', {}
 
+    def get_streamed_sentence(self, sid):
+        """Return a sentence based on given sentence id, parsing further
+        in the document if the sentence has not been found yet."""
+        if sid not in self.sentences and not self.done:
+            self.parse_blocks(sid)
+        count = self.id_counts.get(sid, 0) - 1
+        if count > 0:
+            self.id_counts[sid] = count
+            return self.sentences.get(sid, ('', {}))
+        self.id_counts.pop(sid, None)
+        return self.sentences.pop(sid, ('', {}))
+
     def read_sentence(self, ids):
         """Return a sequence of sentences based on given sentence ids."""
         if len(ids) == 0 or ids[0] == '':
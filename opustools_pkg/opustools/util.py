@@ -1,15 +1,30 @@
 """Utility functions"""
 
+import os
 import bz2
 import gzip
+import sys
+import queue
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 
 
-def file_open(filename, mode='r', encoding='utf8'):
+def file_open(filename, mode='r', encoding='utf8', compress_threads=0):
     """Open file with implicit gzip/bz2 support
 
-    Uses text mode by default regardless of the compression.
+    Uses text mode by default regardless of the compression. Binary
+    modes (e.g. 'rb') return bytes and ignore encoding. If
+    compress_threads is set, gzip/bz2 files opened for writing in text
+    mode are compressed in that many background threads.
 
     """
+    if 'b' in mode:
+        encoding = None
+    if (compress_threads and mode in {'w', 'wt', 'x', 'xt', 'a', 'at'} and
+            filename.endswith(('.gz', '.bz2'))):
+        return ParallelCompressedWriter(filename, mode=mode[0],
+                encoding=encoding, threads=compress_threads)
     if filename.endswith('.bz2'):
         if mode in {'r', 'w', 'x', 'a'}:
             mode += 't'
@@ -19,3 +34,252 @@ def file_open(filename, mode='r', encoding='utf8'):
             mode += 't'
         return gzip.open(filename, mode=mode, encoding=encoding)
     return open(filename, mode=mode, encoding=encoding)
+
+
+def get_file_id(filename):
+    """Return the size and modification time of a file, which tell
+    whether the file has changed"""
+    stat = os.stat(filename)
+    return (stat.st_size, stat.st_mtime_ns)
+
+
+class OutputSink:
+
+    def __init__(self, stream=None, buffer_size=1024*1024):
+        """Collect output text and write it to a stream in large blocks.
+
+        Keyword arguments:
+        stream -- Text file to write to (default None, write to the
+            current sys.stdout). Text for stdout is encoded and written
+            directly to its binary buffer when it has one.
+        buffer_size -- Number of characters collected before writing
+        """
+        self.stream = stream
+        self.buffer_size = buffer_size
+        self.parts = []
+        self.size = 0
+
+    def write(self, text):
+        self.parts.append(text)
+        self.size += len(text)
+        if self.size >= self.buffer_size:
+            self.flush()
+
+    def writelines(self, parts):
+        """Write the parts of an output record without joining them"""
+        self.parts.extend(parts)
+        self.size += sum(map(len, parts))
+        if self.size >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        """Write the collected text"""
+        if not self.parts:
+            return
+        text = ''.join(self.parts)
+        self.parts = []
+        self.size = 0
+        if self.stream is not None:
+            self.stream.write(text)
+            return
+        stdout = sys.stdout
+        buffer = getattr(stdout, 'buffer', None)
+        if buffer is None:
+            stdout.write(text)
+        else:
+            #Text that was printed earlier has to be written first
+            stdout.flush()
+            buffer.write(text.encode(stdout.encoding, stdout.errors))
+            buffer.flush()
+
+    def sync(self):
+        """Write the collected text and store the file on disk. Return
+        the size of the file, or None when writing to stdout."""
+        self.flush()
+        if self.stream is None:
+            sys.stdout.flush()
+            return None
+        self.stream.flush()
+        fileno = self.stream.fileno()
+        os.fsync(fileno)
+        return os.fstat(fileno).st_size
+
+    def close(self):
+        """Write the collected text and close the stream. Stdout is not
+        closed."""
+        self.flush()
+        if self.stream is not None:
+            self.stream.close()
+
+
+class ParallelCompressedWriter:
+
+    def __init__(self, filename, mode='w', encoding='utf8', threads=2,
+            block_size=1024*1024):
+        """Write a gzip or bz2 file, compressing blocks in background
+        threads.
+
+        The text is collected into blocks that are compressed
+        independently and written in order as consecutive gzip members
+        or bz2 streams, which gzip, bz2 and the command line tools read
+        as one file. zlib and bz2 release the GIL while compressing, so
+        compression runs alongside the thread that produces the text.
+
+        Positional arguments:
+        filename -- Name of the file, ending with .gz or .bz2
+
+        Keyword arguments:
+        mode -- 'w', 'x' or 'a' (default w)
+        encoding -- Encoding of the text (default utf8)
+        threads -- Number of compression threads (default 2)
+        block_size -- Number of bytes compressed at a time
+        """
+        if filename.endswith('.bz2'):
+            self.compress = bz2.compress
+        else:
+            self.compress = gzip.compress
+        self.name = filename
+        self.encoding = encoding
+        self.block_size = block_size
+        self.file = open(filename, mode+'b')
+        self.executor = ThreadPoolExecutor(max_workers=threads)
+        self.max_pending = 2*threads
+        self.pending = deque()
+        self.parts = []
+        self.size = 0
+        self.blocks = 0
+        self.closed = False
+
+    def write(self, text):
+        data = text.encode(self.encoding)
+        self.parts.append(data)
+        self.size += len(data)
+        if self.size >= self.block_size:
+            self.submit_block()
+        return len(text)
+
+    def submit_block(self):
+        """Start compressing the collected data and write the blocks that
+        are ready"""
+        if self.parts:
+            block = b''.join(self.parts)
+            self.parts = []
+            self.size = 0
+            self.pending.append(self.executor.submit(self.compress, block))
+            self.blocks += 1
+        while self.pending and (len(self.pending) > self.max_pending or
+                self.pending[0].done()):
+            self.file.write(self.pending.popleft().result())
+
+    def flush(self):
+        """Compress and write all collected data"""
+        self.submit_block()
+        while self.pending:
+            self.file.write(self.pending.popleft().result())
+        self.file.flush()
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            if not (self.blocks or self.parts):
+                #An empty bz2 file is not a valid bz2 file
+                self.parts.append(b'')
+            self.flush()
+        finally:
+            self.executor.shutdown()
+            self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class ReadAheadReader:
+
+    def __init__(self, document, block_size=1024*1024, queue_size=8):
+        """Read a gzip or bz2 file in binary mode, decompressing it in a
+        background thread.
+
+        The thread keeps up to queue_size decompressed blocks ready, so
+        that decompression runs alongside the parsing of the previous
+        blocks.
+
+        Positional arguments:
+        document -- Name of the file, ending with .gz or .bz2, or a file
+            opened in binary mode that decompresses when read
+
+        Keyword arguments:
+        block_size -- Number of bytes decompressed at a time
+        queue_size -- Maximum number of blocks waiting to be read
+        """
+        if isinstance(document, str):
+            document = file_open(document, mode='rb')
+        self.file = document
+        self.name = document.name
+        self.block_size = block_size
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.stop = threading.Event()
+        self.buffer = b''
+        self.eof = False
+        self.closed = False
+        self.thread = threading.Thread(target=self.read_blocks, daemon=True)
+        self.thread.start()
+
+    def read_blocks(self):
+        """Decompress blocks into the queue, an empty block marks the end
+        of the file and an exception is passed on to the reader"""
+        try:
+            block = self.file.read(self.block_size)
+            while block and not self.stop.is_set():
+                self.queue.put(block)
+                block = self.file.read(self.block_size)
+            self.queue.put(b'')
+        except Exception as e:
+            self.queue.put(e)
+
+    def read(self, size=-1):
+        """Return up to size bytes, or the rest of the file if size is
+        negative. Returns b'' at the end of the file."""
+        if size < 0:
+            return b''.join(iter(lambda: self.read(self.block_size), b''))
+        if not self.buffer:
+            if self.eof:
+                return b''
+            block = self.queue.get()
+            if isinstance(block, Exception):
+                self.eof = True
+                raise block
+            if not block:
+                self.eof = True
+            self.buffer = block
+        if len(self.buffer) <= size:
+            data, self.buffer = self.buffer, b''
+        else:
+            data, self.buffer = self.buffer[:size], self.buffer[size:]
+        return data
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        self.stop.set()
+        #Take blocks from the queue until the thread is not blocked on it
+        while self.thread.is_alive():
+            try:
+                self.queue.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
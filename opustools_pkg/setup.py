@@ -14,7 +14,12 @@ setuptools.setup(
     url="https://github.com/Helsinki-NLP/OpusTools",
     packages=setuptools.find_packages(),
     scripts=["bin/opus_read", "bin/opus_cat", "bin/opus_get",
-        "bin/opus_langid", "bin/opus_express"],
+        "bin/opus_langid", "bin/opus_express", "bin/opus_compile"],
+    extras_require={
+        #Restart points for starting to read gzip alignment files from a
+        #document pair without decompressing the part before it
+        "seek": ["indexed_gzip"],
+    },
     classifiers=(
         "Programming Language :: Python :: 3",
         "License :: OSI Approved :: MIT License",
@@ -5,3 +5,4 @@ from .test_opus_read import TestOpusRead
 from .test_opus_cat import TestOpusCat
 from .test_opus_get import TestOpusGet
 from .test_opus_langid import TestOpusLangid
+from .test_link_table import TestLinkTable
@@ -4,9 +4,14 @@ import shutil
 import os
 import gzip
 
-from opustools.parse.block_parser import BlockParser
-from opustools.parse.alignment_parser import AlignmentParser
-from opustools.util import file_open
+from opustools.parse.block_parser import BlockParser, CHUNK_SIZE
+from opustools.parse.link_parser import LinkParser
+from opustools.parse.alignment_parser import (AlignmentParser,
+        link_filter_type)
+from opustools.parse.compiled_alignment import (compile_alignment,
+        CompiledAlignment, find_compiled)
+from opustools.parse.alignment_index import AlignmentIndex
+from opustools.util import file_open, get_file_id
 
 class TestAlignmentParser(unittest.TestCase):
 
@@ -76,4 +81,124 @@ class TestAlignmentParser(unittest.TestCase):
         self.assertEqual(trg_doc, None)
         ap.bp.close_document()
 
+    def test_collect_links_from_single_chunk(self):
+        ap = AlignmentParser(file_open(self.align_path_gz), chunk_size=10**6)
+        attrs, src_set, trg_set, src_doc, trg_doc = ap.collect_links()
+        self.assertEqual(src_set, {'s1'})
+        attrs, src_set, trg_set, src_doc, trg_doc = ap.collect_links()
+        self.assertEqual(attrs, [{'id': 'SL1', 'xtargets': 's21;'},
+            {'id': 'SL2', 'xtargets': 's0 s1;s2 s3'}])
+        self.assertEqual(src_doc, 'en/2.xml.gz')
+        attrs, src_set, trg_set, src_doc, trg_doc = ap.collect_links()
+        self.assertEqual(src_doc, None)
+        ap.bp.close_document()
+
+    def test_collect_link_records(self):
+        ap = AlignmentParser(file_open(self.align_path),
+                src_trg_range=('2', '2'))
+        links, src_set, trg_set, src_doc, trg_doc = ap.collect_link_records()
+        self.assertEqual(links, [])
+        links, src_set, trg_set, src_doc, trg_doc = ap.collect_link_records()
+        self.assertEqual(links, [(('s0', 's1'), ('s2', 's3'),
+            {'id': 'SL2', 'xtargets': 's0 s1;s2 s3'})])
+        self.assertEqual(src_set, {'s0', 's1'})
+        self.assertEqual(trg_doc, 'fi/2.xml.gz')
+        ap.bp.close_document()
+
+    def test_link_filter(self):
+        self.assertEqual(link_filter_type('all', 'all', None, None, False),
+                None)
+        keep_link = link_filter_type({1}, 'all', 'certainty', 0.5, True)
+        self.assertTrue(keep_link(('s1',), ('s1', 's2'), {'certainty': '0.6'}))
+        self.assertFalse(keep_link(('s1',), ('s1',), {'certainty': '0.4'}))
+        self.assertFalse(keep_link(('s1',), ('s1',), {}))
+        self.assertFalse(keep_link(('s1', 's2'), ('s1',),
+            {'certainty': '0.6'}))
+        self.assertFalse(keep_link(('s1',), (), {'certainty': '0.6'}))
+        keep_link = link_filter_type('all', 'all', None, None, True)
+        self.assertFalse(keep_link((), ('s1',), {}))
+        keep_link = link_filter_type('all', {0, 1}, None, None, False)
+        self.assertTrue(keep_link((), ('s1',), {}))
+        self.assertFalse(keep_link((), ('s1', 's2'), {}))
+
+    def test_alignment_index_checks_restart_point_file(self):
+        align_path = os.path.join(self.tempdir, 'align_index.xml')
+        shutil.copyfile(self.align_path, align_path)
+        index = AlignmentIndex(align_path)
+        self.assertEqual([entry[:2] for entry in index.doc_pairs], [
+            ('en/Doyle_Arthur_Conan-Hound_of_the_Baskervilles.xml.gz',
+                'fi/Doyle_Arthur_Conan-Hound_of_the_Baskervilles.xml.gz'),
+            ('en/2.xml.gz', 'fi/2.xml.gz')])
+        self.assertFalse(index.has_gzip_index())
+        with open(index.gzip_index_name, 'wb') as f:
+            f.write(b'restart points')
+        index.gzip_index_id = get_file_id(index.gzip_index_name)
+        self.assertTrue(index.has_gzip_index())
+        #A restart point file written for another version of the file
+        with open(index.gzip_index_name, 'wb') as f:
+            f.write(b'other restart points')
+        self.assertFalse(index.has_gzip_index())
+        self.assertFalse(AlignmentIndex(align_path).has_gzip_index())
+
+    def test_store_alignment_index_while_reading(self):
+        align_path = os.path.join(self.tempdir, 'align_partial.xml.gz')
+        shutil.copyfile(self.align_path_gz, align_path)
+        index = AlignmentIndex(align_path, build=False)
+        self.assertEqual((index.doc_pairs, index.is_complete()), ([], False))
+        lp = LinkParser(index.open_at(0), chunk_size=CHUNK_SIZE)
+        lp.get_link_groups()
+        #The run stops before the end of the file
+        index.update(lp.group_offsets, None)
+        lp.close_document()
+
+        index = AlignmentIndex(align_path, build=False)
+        self.assertEqual(len(index.doc_pairs), 2)
+        self.assertFalse(index.is_complete())
+        self.assertTrue(index.covers(1))
+        self.assertFalse(index.covers('en/3.xml.gz'))
+        self.assertFalse(index.covers(0, (0, 2)))
+        lp = LinkParser(index.open_at(1), chunk_size=CHUNK_SIZE)
+        self.assertEqual(lp.get_link_groups()[0][0], 'en/2.xml.gz')
+        self.assertEqual(lp.get_link_groups(), None)
+        index.update(lp.group_offsets, lp.end_offset)
+        lp.close_document()
+
+        index = AlignmentIndex(align_path, build=False)
+        built = AlignmentIndex(align_path, index_name=os.path.join(
+            self.tempdir, 'align_built.lgidx'))
+        self.assertTrue(index.is_complete())
+        self.assertEqual((index.header, index.doc_pairs, index.end),
+            (built.header, built.doc_pairs, built.end))
+
+    def test_collect_links_from_compiled_alignment(self):
+        compiled_path = self.align_path_gz + '.bin'
+        self.assertEqual(find_compiled(self.align_path_gz), None)
+        compile_alignment(file_open(self.align_path_gz), compiled_path,
+                source_name=self.align_path_gz)
+        self.assertEqual(find_compiled(self.align_path_gz), compiled_path)
+        ap = AlignmentParser(CompiledAlignment(compiled_path),
+                leave_non_alignments_out=True)
+        attrs, src_set, trg_set, src_doc, trg_doc = ap.collect_links()
+        self.assertEqual(attrs, [{'id': 'SL1', 'xtargets': 's1;s1'}])
+        self.assertEqual(trg_set, {'s1'})
+        self.assertEqual(src_doc,
+            'en/Doyle_Arthur_Conan-Hound_of_the_Baskervilles.xml.gz')
+        attrs, src_set, trg_set, src_doc, trg_doc = ap.collect_links()
+        self.assertEqual(attrs, [{'id': 'SL2', 'xtargets': 's0 s1;s2 s3'}])
+        self.assertEqual(trg_doc, 'fi/2.xml.gz')
+        attrs, src_set, trg_set, src_doc, trg_doc = ap.collect_links()
+        self.assertEqual((attrs, src_doc), ([], None))
+        ap.bp.close_document()
 
+        #A compiled file is not used if the alignment file has changed,
+        #even if the alignment file is older
+        stat = os.stat(self.align_path_gz)
+        os.utime(self.align_path_gz, ns=(stat.st_atime_ns,
+            stat.st_mtime_ns - 10**9))
+        self.assertEqual(find_compiled(self.align_path_gz), None)
+        os.utime(self.align_path_gz, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        self.assertEqual(find_compiled(self.align_path_gz), compiled_path)
+        compile_alignment(file_open(self.align_path_gz), compiled_path)
+        self.assertEqual(find_compiled(self.align_path_gz), None)
+        self.assertEqual(find_compiled(compiled_path), compiled_path)
+        os.remove(compiled_path)
@@ -148,6 +148,16 @@ class TestBlockParser(unittest.TestCase):
         self.assertEqual(blocks[1].name, 'child2')
         bp.close_document()
 
+    def test_get_complete_blocks_in_chunks(self):
+        bp = BlockParser(file_open(self.xml_path), data_tag='stamp',
+                chunk_size=1024)
+        blocks = bp.get_complete_blocks()
+        self.assertEqual([b.name for b in blocks],
+                ['stamp', 'child1', 'stamp', 'child2', 'parent'])
+        self.assertEqual(blocks[2].data, '321')
+        self.assertEqual(bp.get_complete_blocks(), None)
+        bp.close_document()
+
     def test_parse_document(self):
         bp = BlockParser(file_open(self.xml_path))
         blocks = bp.get_complete_blocks()
@@ -208,6 +218,21 @@ class TestBlockParser(unittest.TestCase):
         self.assertEqual(blocks[0].parent.name, 'document')
         bp.close_document()
 
+    def test_parsing_os_with_id_set(self):
+        bp = BlockParser(file_open(self.os_path), data_tag='w',
+                id_set={'2'})
+        blocks = bp.get_complete_blocks()
+        self.assertEqual(blocks[0].name, 'w')
+        self.assertEqual(blocks[0].data, '-')
+        self.assertEqual(blocks[0].parent.attributes['id'], '2')
+        for i in range(5):
+            blocks = bp.get_complete_blocks()
+        self.assertEqual(blocks[0].name, 'time')
+        blocks = bp.get_complete_blocks()
+        self.assertEqual(blocks[0].name, 's')
+        self.assertEqual(bp.get_complete_blocks(), None)
+        bp.close_document()
+
     def test_tag_in_parents(self):
         bp = BlockParser(file_open(self.books_path))
         for i in range(22):
@@ -216,6 +241,19 @@ class TestBlockParser(unittest.TestCase):
         self.assertTrue(bp.tag_in_parents('s', blocks[0]))
         bp.close_document()
 
+    def test_enclosing_sentence(self):
+        bp = BlockParser(file_open(self.books_path), data_tag='w')
+        for i in range(19):
+            blocks = bp.get_complete_blocks()
+        self.assertEqual(blocks[0].name, 'w')
+        self.assertEqual(blocks[0].sentence.attributes['id'], 's1')
+        self.assertEqual(bp.sentence.attributes['id'], 's1')
+        bp.close_document()
+        bp = BlockParser(file_open(self.books_path), data_tag='w')
+        blocks = bp.get_complete_blocks()
+        self.assertEqual(blocks[0].sentence, None)
+        bp.close_document()
+
     def test_get_raw_tag(self):
         bp = BlockParser(file_open(self.os_path), data_tag='w')
         blocks = bp.get_complete_blocks()
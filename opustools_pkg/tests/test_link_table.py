@@ -0,0 +1,74 @@
+import unittest
+import tempfile
+import shutil
+import os
+
+import numpy as np
+
+from opustools.link_table import LinkTable
+from opustools.util import file_open
+
+class TestLinkTable(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(self):
+        self.tempdir = tempfile.mkdtemp()
+
+        self.align_path = os.path.join(self.tempdir, 'align.xml')
+        with open(self.align_path, 'w') as align_xml:
+            align_xml.write("""<?xml version="1.0" encoding="utf-8"?>
+                <!DOCTYPE cesAlign PUBLIC "-//CES//DTD XML cesAlign//EN" "">
+                <cesAlign version="1.0">
+                <linkGrp targType="s" fromDoc="en/1.xml.gz" toDoc="fi/1.xml.gz" >
+                <link xtargets="s1;s1" id="SL1" certainty="0.9"/>
+                <link xtargets=";s2" id="SL2" certainty="0.2"/>
+                  </linkGrp>
+                <linkGrp targType="s" fromDoc="en/2.xml.gz" toDoc="fi/2.xml.gz" >
+                <link xtargets="s21;" id="SL1"/>
+                <link xtargets="s0 s1;s2" id="SL2" certainty="0.5" overlap="x"/>
+                <link xtargets="s2;s3" id="SL3" certainty="0.7"/>
+                  </linkGrp>
+                </cesAlign>
+                """)
+
+        self.table = LinkTable(file_open(self.align_path))
+
+    @classmethod
+    def tearDownClass(self):
+        shutil.rmtree(self.tempdir)
+
+    def test_columns(self):
+        table = self.table
+        self.assertEqual(len(table), 5)
+        self.assertEqual(table.doc_pairs, [('en/1.xml.gz', 'fi/1.xml.gz'),
+            ('en/2.xml.gz', 'fi/2.xml.gz')])
+        self.assertEqual(list(table.doc_index), [0, 0, 1, 1, 1])
+        self.assertEqual(list(table.src_counts), [1, 0, 1, 2, 1])
+        self.assertEqual(list(table.src_ids), ['s1', 's21', 's0', 's1', 's2'])
+        self.assertEqual(sorted(table.attributes), ['certainty', 'overlap'])
+        np.testing.assert_equal(table.attributes['certainty'],
+            [0.9, 0.2, np.nan, 0.5, 0.7])
+        np.testing.assert_equal(table.attributes['overlap'],
+            [np.nan]*5)
+
+    def test_mask(self):
+        table = self.table
+        self.assertEqual(list(table.mask(src_range='1', trg_range='1')),
+            [True, False, False, False, True])
+        self.assertEqual(list(table.mask(attribute='certainty',
+            threshold='0.5')), [True, False, False, True, True])
+        self.assertEqual(list(table.mask(leave_non_alignments_out=True)),
+            [True, False, False, True, True])
+        self.assertEqual(list(table.mask(src_range='1-2',
+            attribute='overlap', threshold=0)), [False]*5)
+
+    def test_statistics(self):
+        table = self.table
+        self.assertEqual(table.shape_histogram(),
+            {(1, 1): 2, (0, 1): 1, (1, 0): 1, (2, 1): 1})
+        self.assertEqual(table.shape_histogram(
+            table.mask(leave_non_alignments_out=True)), {(1, 1): 2, (2, 1): 1})
+        self.assertEqual(list(table.threshold_sweep('certainty',
+            [0, 0.5, 0.8, 1])), [4, 3, 1, 0])
+        self.assertEqual(list(table.links(table.mask(src_range='2'))),
+            [('en/2.xml.gz', 'fi/2.xml.gz', ('s0', 's1'), ('s2',))])
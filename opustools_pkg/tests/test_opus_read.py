@@ -9,11 +9,15 @@ import shutil
 import zipfile
 import tempfile
 import bz2
+import json
 
 from opustools import OpusRead, OpusGet
 from opustools.parse.block_parser import BlockParserError
 from opustools.parse.sentence_parser import SentenceParserError
+from opustools.parse.alignment_index import AlignmentIndexError
 from opustools.parse.alignment_parser import AlignmentParserError
+from opustools.checkpoint import CheckpointError
+from opustools.opus_file_handler import OpusFileHandler
 
 def pairPrinterToVariable(**kwargs):
     old_stdout = sys.stdout
@@ -1212,6 +1216,430 @@ class TestOpusRead(unittest.TestCase):
             '(trg)="s1">test_fi1 test_fi2'
             '\n================================\n')
 
+    def test_read_document_pairs_with_workers(self):
+        with open(os.path.join(self.tempdir1, 'test_files', 'testlinks'),
+                'w') as f:
+            f.write(
+                '<?xml version="1.0" encoding="utf-8"?>\n<!DOCTYPE cesAlign '
+                'PUBLIC "-//CES//DTD XML cesAlign//EN" "">'
+                '\n<cesAlign version="1.0">\n<linkGrp fromDoc="test_files/'
+                'test_en" toDoc="test_files/test_fi" >\n<link xtargets='
+                '"s1;s1"/>\n </linkGrp>\n<linkGrp fromDoc="test_files/'
+                'no_file" toDoc="test_files/test_fi" >\n<link xtargets='
+                '"s1;s1"/>\n </linkGrp>\n<linkGrp fromDoc="test_files/'
+                'test_en" toDoc="test_files/test_fi" >\n<link xtargets='
+                '"s1;s1"/>\n </linkGrp>\n<linkGrp fromDoc="test_files/'
+                'test_en" toDoc="test_files/test_fi" >\n<link xtargets='
+                '"s1;s1"/>\n </linkGrp>\n</cesAlign>')
+        with open(os.path.join(self.tempdir1, 'test_files', 'test_en'),
+                'w') as f:
+            f.write(
+                '<?xml version="1.0" encoding="utf-8"?>\n<text>\n'
+                '<body>\n<s id="s1">\n <w>test_en1</w>\n <w>test_en2'
+                '</w>\n</s>\n </body>\n</text>')
+        with zipfile.ZipFile(os.path.join(self.tempdir1, 'test_en.zip'),
+                'w') as zf:
+            zf.write(os.path.join(self.tempdir1, 'test_files', 'test_en'),
+                arcname=os.path.join('test_files', 'test_en'))
+        with open(os.path.join(self.tempdir1, 'test_files', 'test_fi'),
+                'w') as f:
+            f.write(
+                '<?xml version="1.0" encoding="utf-8"?>\n<text>\n <body>\n'
+                '<s id="s1">\n <w>test_fi1</w>\n <w>test_fi2'
+                '</w>\n</s>\n </body>\n</text>')
+        with zipfile.ZipFile(os.path.join(self.tempdir1, 'test_fi.zip'),
+                'w') as zf:
+            zf.write(os.path.join(self.tempdir1, 'test_files', 'test_fi'),
+                arcname=os.path.join('test_files', 'test_fi'))
+
+        var = pairPrinterToVariable(directory='Books', source='en',
+            target='fi', alignment_file=os.path.join(self.tempdir1,
+                'test_files', 'testlinks'),
+            source_zip = os.path.join(self.tempdir1, 'test_en.zip'),
+            target_zip = os.path.join(self.tempdir1, 'test_fi.zip'),
+            write_mode='moses', maximum=2, workers=2)
+        self.assertEqual(var,
+            'test_en1 test_en2\ttest_fi1 test_fi2\n'
+            "\nThere is no item named 'test_files/no_file' in the archive "
+            "'"+os.path.join(self.tempdir1, 'test_en.zip')+"'\n"
+            'Continuing from next sentence file pair.\n'
+            'test_en1 test_en2\ttest_fi1 test_fi2\n')
+
+        #Streaming and progress messages work in the workers as well
+        arguments = {'directory': 'Books', 'source': 'en', 'target': 'fi',
+            'alignment_file': os.path.join(self.tempdir1, 'test_files',
+                'testlinks'),
+            'source_zip': os.path.join(self.tempdir1, 'test_en.zip'),
+            'target_zip': os.path.join(self.tempdir1, 'test_fi.zip'),
+            'write_mode': 'moses', 'maximum': 2}
+        for options in [{'stream': True}, {'verbose': True}]:
+            self.assertEqual(
+                pairPrinterToVariable(workers=2, **options, **arguments),
+                pairPrinterToVariable(**options, **arguments))
+
+    def test_maximum_reached_before_end_of_documents(self):
+        with open(os.path.join(self.tempdir1, 'test_files', 'testlinks'),
+                'w') as f:
+            f.write(
+                '<?xml version="1.0" encoding="utf-8"?>\n<!DOCTYPE cesAlign '
+                'PUBLIC "-//CES//DTD XML cesAlign//EN" "">'
+                '\n<cesAlign version="1.0">\n<linkGrp fromDoc="test_files/'
+                'test_en" toDoc="test_files/test_fi" >\n<link xtargets='
+                '"s1;s1"/>\n<link xtargets="s2;s2"/>\n </linkGrp>\n'
+                '</cesAlign>')
+        #The documents cannot be parsed after the first chunk
+        filler = ''.join('<s id="f{}">\n <w>filler</w>\n</s>\n'.format(i)
+                for i in range(40000))
+        for lang in ['en', 'fi']:
+            with open(os.path.join(self.tempdir1, 'test_files',
+                    'test_'+lang), 'w') as f:
+                f.write(
+                    '<?xml version="1.0" encoding="utf-8"?>\n<text>\n'
+                    '<body>\n<s id="s1">\n <w>test_{0}1</w>\n <w>test_{0}2'
+                    '</w>\n</s>\n{1}<s id="s2">\n <w>test_{0}3</s>\n'
+                    ' </body>\n</text>'.format(lang, filler))
+            with zipfile.ZipFile(os.path.join(self.tempdir1,
+                    'test_'+lang+'.zip'), 'w') as zf:
+                zf.write(os.path.join(self.tempdir1, 'test_files',
+                    'test_'+lang),
+                    arcname=os.path.join('test_files', 'test_'+lang))
+
+        var = pairPrinterToVariable(directory='Books', source='en',
+            target='fi', alignment_file=os.path.join(self.tempdir1,
+                'test_files', 'testlinks'),
+            source_zip = os.path.join(self.tempdir1, 'test_en.zip'),
+            target_zip = os.path.join(self.tempdir1, 'test_fi.zip'),
+            write_mode='moses', maximum=1)
+        self.assertEqual(var, 'test_en1 test_en2\ttest_fi1 test_fi2\n')
+
+    def test_iter_pairs(self):
+        with open(os.path.join(self.tempdir1, 'test_files', 'testlinks'),
+                'w') as f:
+            f.write(
+                '<?xml version="1.0" encoding="utf-8"?>\n<!DOCTYPE cesAlign '
+                'PUBLIC "-//CES//DTD XML cesAlign//EN" "">'
+                '\n<cesAlign version="1.0">\n<linkGrp fromDoc="test_files/'
+                'test_en" toDoc="test_files/test_fi" >\n<link xtargets='
+                '"s1;s1" id="SL1"/>\n<link xtargets="s2;" id="SL2"/>\n'
+                ' </linkGrp>\n</cesAlign>')
+        for lang in ['en', 'fi']:
+            with open(os.path.join(self.tempdir1, 'test_files',
+                    'test_'+lang), 'w') as f:
+                f.write(
+                    '<?xml version="1.0" encoding="utf-8"?>\n<text>\n'
+                    '<body>\n<s id="s1">\n <w>test_{0}1</w>\n <w>test_{0}2'
+                    '</w>\n</s>\n<s id="s2">\n <w>test_{0}3</w>\n</s>\n'
+                    ' </body>\n</text>'.format(lang))
+            with zipfile.ZipFile(os.path.join(self.tempdir1,
+                    'test_'+lang+'.zip'), 'w') as zf:
+                zf.write(os.path.join(self.tempdir1, 'test_files',
+                    'test_'+lang),
+                    arcname=os.path.join('test_files', 'test_'+lang))
+
+        opr = OpusRead(directory='Books', source='fi', target='en',
+            alignment_file=os.path.join(self.tempdir1, 'test_files',
+                'testlinks'),
+            source_zip = os.path.join(self.tempdir1, 'test_fi.zip'),
+            target_zip = os.path.join(self.tempdir1, 'test_en.zip'))
+        pairs = list(opr.iter_pairs())
+        self.assertEqual(pairs, [
+            ('test_files/test_fi', 'test_files/test_en', ('s1',), ('s1',),
+                'test_fi1 test_fi2', 'test_en1 test_en2',
+                {'xtargets': 's1;s1', 'id': 'SL1'}),
+            ('test_files/test_fi', 'test_files/test_en', (), ('s2',),
+                '', 'test_en3', {'xtargets': 's2;', 'id': 'SL2'})])
+        self.assertEqual(pairs[0].src_text, 'test_fi1 test_fi2')
+
+        #Output files are not opened
+        result_name = os.path.join(self.tempdir1, 'test_files',
+            'iter_pairs_result')
+        with open(result_name, 'w') as f:
+            f.write('earlier output')
+        opr = OpusRead(directory='Books', source='fi', target='en',
+            alignment_file=os.path.join(self.tempdir1, 'test_files',
+                'testlinks'),
+            source_zip = os.path.join(self.tempdir1, 'test_fi.zip'),
+            target_zip = os.path.join(self.tempdir1, 'test_en.zip'),
+            write=[result_name])
+        self.assertEqual(list(opr.iter_pairs()), pairs)
+        with open(result_name) as f:
+            self.assertEqual(f.read(), 'earlier output')
+
+    def test_start_from_doc_pair(self):
+        alignment_name = os.path.join(self.tempdir1, 'test_files',
+            'testlinks_start.xml.gz')
+        with gzip.open(alignment_name, 'wt') as f:
+            f.write(
+                '<?xml version="1.0" encoding="utf-8"?>\n<!DOCTYPE cesAlign '
+                'PUBLIC "-//CES//DTD XML cesAlign//EN" "">'
+                '\n<cesAlign version="1.0">\n<linkGrp fromDoc="test_files/'
+                'test_en" toDoc="test_files/test_fi" >\n<link xtargets='
+                '"s1;s1" id="SL1"/>\n </linkGrp>\n<linkGrp fromDoc="test_'
+                'files/test_en2" toDoc="test_files/test_fi2" >\n<link '
+                'xtargets="s2;s2" id="SL2"/>\n </linkGrp>\n</cesAlign>')
+        for lang in ['en', 'fi']:
+            with zipfile.ZipFile(os.path.join(self.tempdir1,
+                    'test_'+lang+'.zip'), 'w') as zf:
+                for doc in ['test_'+lang, 'test_'+lang+'2']:
+                    zf.writestr(os.path.join('test_files', doc),
+                        '<?xml version="1.0" encoding="utf-8"?>\n<text>\n'
+                        '<body>\n<s id="s1">\n <w>{0}1</w>\n</s>\n<s id="s2">'
+                        '\n <w>{0}2</w>\n</s>\n </body>\n</text>'.format(doc))
+
+        for start in [1, 'test_files/test_en2', '1']:
+            var = pairPrinterToVariable(directory='Books', source='en',
+                target='fi', alignment_file=alignment_name,
+                source_zip=os.path.join(self.tempdir1, 'test_en.zip'),
+                target_zip=os.path.join(self.tempdir1, 'test_fi.zip'),
+                write_mode='moses', start_doc_pair=start)
+            self.assertEqual(var, 'test_en22\ttest_fi22\n')
+        self.assertTrue(os.path.isfile(alignment_name+'.lgidx'))
+
+        var = pairPrinterToVariable(directory='Books', source='en',
+            target='fi', alignment_file=alignment_name,
+            source_zip=os.path.join(self.tempdir1, 'test_en.zip'),
+            target_zip=os.path.join(self.tempdir1, 'test_fi.zip'),
+            write_mode='moses', start_doc_pair=0)
+        self.assertEqual(var, 'test_en1\ttest_fi1\ntest_en22\ttest_fi22\n')
+
+        #The index is kept in memory if it cannot be written
+        os.remove(alignment_name+'.lgidx')
+        with mock.patch('opustools.parse.alignment_index.os.replace',
+                side_effect=PermissionError('Permission denied')):
+            var = pairPrinterToVariable(directory='Books', source='en',
+                target='fi', alignment_file=alignment_name,
+                source_zip=os.path.join(self.tempdir1, 'test_en.zip'),
+                target_zip=os.path.join(self.tempdir1, 'test_fi.zip'),
+                write_mode='moses', start_doc_pair=1)
+        self.assertEqual(var, 'test_en22\ttest_fi22\n')
+        self.assertFalse(os.path.isfile(alignment_name+'.lgidx'))
+        self.assertEqual([f for f in os.listdir(os.path.dirname(
+            alignment_name)) if f.endswith('.tmp')], [])
+
+        with self.assertRaises(AlignmentIndexError):
+            OpusRead(directory='Books', source='en', target='fi',
+                alignment_file=alignment_name,
+                source_zip=os.path.join(self.tempdir1, 'test_en.zip'),
+                target_zip=os.path.join(self.tempdir1, 'test_fi.zip'),
+                start_doc_pair='test_files/test_en3')
+
+    def test_find_zip_member(self):
+        #The prefixed name is first in one zip file and last in the other
+        members = [('x.xml.gz', 'unprefixed'), ('Books/xml/x.xml', 'prefixed'),
+            ('y.xml', 'unprefixed only')]
+        for lang, lang_members in [('en', members), ('fi', members[::-1])]:
+            with zipfile.ZipFile(os.path.join(self.tempdir1,
+                    'test_members_'+lang+'.zip'), 'w') as zf:
+                for name, content in lang_members:
+                    zf.writestr(name, content)
+        of_handler = OpusFileHandler(self.tempdir1,
+            os.path.join(self.tempdir1, 'test_members_en.zip'),
+            os.path.join(self.tempdir1, 'test_members_fi.zip'),
+            'Books', 'latest', 'xml', ('en', 'fi'), False, True)
+        #A name with the directory and preprocessing prefix takes
+        #precedence over an identical name without it
+        for direction in ['src', 'trg']:
+            zip_file, member = of_handler.find_zip_member('x.xml.gz',
+                direction)
+            self.assertEqual(member, 'Books/xml/x.xml')
+            self.assertEqual(zip_file.read(member), b'prefixed')
+            self.assertEqual(of_handler.map_members(zip_file),
+                {'x.xml.gz': 'Books/xml/x.xml',
+                    'Books/xml/x.xml': 'Books/xml/x.xml', 'y.xml': 'y.xml'})
+        self.assertEqual(of_handler.find_zip_member('y.xml', 'src')[1],
+            'y.xml')
+        with self.assertRaises(KeyError) as error:
+            of_handler.find_zip_member('z.xml.gz', 'src')
+        self.assertIn("There is no item named 'z.xml.gz' in the archive",
+            error.exception.args[0])
+        of_handler.close_zipfiles()
+
+    def test_resume_from_checkpoint(self):
+        alignment_name = os.path.join(self.tempdir1, 'test_files',
+            'testlinks_resume.xml.gz')
+        with gzip.open(alignment_name, 'wt') as f:
+            f.write(
+                '<?xml version="1.0" encoding="utf-8"?>\n<!DOCTYPE cesAlign '
+                'PUBLIC "-//CES//DTD XML cesAlign//EN" "">'
+                '\n<cesAlign version="1.0">\n<linkGrp fromDoc="test_files/'
+                'test_en" toDoc="test_files/test_fi" >\n<link xtargets='
+                '"s1;s1" id="SL1"/>\n<link xtargets="s2;s2" id="SL2"/>\n'
+                ' </linkGrp>\n<linkGrp fromDoc="test_files/test_en2" '
+                'toDoc="test_files/test_fi2" >\n<link xtargets="s1;s1" '
+                'id="SL1"/>\n<link xtargets="s2;s2" id="SL2"/>\n </linkGrp>'
+                '\n</cesAlign>')
+        for lang in ['en', 'fi']:
+            with zipfile.ZipFile(os.path.join(self.tempdir1,
+                    'test_'+lang+'.zip'), 'w') as zf:
+                for doc in ['test_'+lang, 'test_'+lang+'2']:
+                    zf.writestr(os.path.join('test_files', doc),
+                        '<?xml version="1.0" encoding="utf-8"?>\n<text>\n'
+                        '<body>\n<s id="s1">\n <w>{0}1</w>\n</s>\n<s id="s2">'
+                        '\n <w>{0}2</w>\n</s>\n </body>\n</text>'.format(doc))
+
+        result_name = os.path.join(self.tempdir1, 'test_files',
+            'resumed.tmx.gz')
+        checkpoint_name = os.path.join(self.tempdir1, 'test_files',
+            'checkpoint.json')
+        arguments = {'directory': 'Books', 'source': 'en', 'target': 'fi',
+            'alignment_file': alignment_name,
+            'source_zip': os.path.join(self.tempdir1, 'test_en.zip'),
+            'target_zip': os.path.join(self.tempdir1, 'test_fi.zip'),
+            'write_mode': 'tmx', 'write': [result_name],
+            'checkpoint': checkpoint_name}
+        #The maximum is reached within the second document pair, which is
+        #written again when resuming
+        OpusRead(maximum=3, **arguments).printPairs()
+        with open(checkpoint_name) as f:
+            self.assertEqual(json.load(f)['doc_pair'], 1)
+        #The positions of the linkGrps were stored while reading, so the
+        #resumed run does not parse the alignment file to index it
+        self.assertTrue(os.path.isfile(alignment_name+'.lgidx'))
+        #Output written after the checkpoint is removed
+        with open(result_name, 'ab') as f:
+            f.write(b'lost output')
+        with mock.patch('opustools.parse.alignment_index.AlignmentIndex.'
+                'build', side_effect=AssertionError('index was built')):
+            OpusRead(resume=True, **arguments).printPairs()
+        with open(checkpoint_name) as f:
+            state = json.load(f)
+        self.assertEqual((state['doc_pair'], state['total']), (2, 4))
+
+        tu = ('\t\t<tu>\n\t\t\t<tuv xml:lang="en"><seg>{0}</seg></tuv>\n\t\t\t'
+            '<tuv xml:lang="fi"><seg>{1}</seg></tuv>\n\t\t</tu>\n')
+        with gzip.open(result_name, 'rt') as f:
+            self.assertEqual(f.read(),
+                '<?xml version="1.0" encoding="utf-8"?>\n<tmx version="1.4.">'
+                '\n<header srclang="en"\n\tadminlang="en"\n\tsegtype='
+                '"sentence"\n\tdatatype="PlainText" />\n\t<body>\n' +
+                tu.format('test_en1', 'test_fi1') +
+                tu.format('test_en2', 'test_fi2') +
+                tu.format('test_en21', 'test_fi21') +
+                tu.format('test_en22', 'test_fi22') +
+                '\t</body>\n</tmx>\n')
+
+        #A run is not resumed with different arguments
+        with open(result_name, 'rb') as f:
+            result = f.read()
+        for changed in [{'write_mode': 'normal'}, {'num_shards': 2},
+                {'start_doc_pair': 1}, {'src_langid': ['en', '0.9']},
+                {'source_annotations': ['pos']}]:
+            with self.assertRaises(CheckpointError):
+                OpusRead(resume=True, **dict(arguments, **changed))
+        with open(result_name, 'rb') as f:
+            self.assertEqual(f.read(), result)
+
+    def test_concatenated_shards_are_same_as_single_output(self):
+        alignment_name = os.path.join(self.tempdir1, 'test_files',
+            'testlinks_shards.xml.gz')
+        with gzip.open(alignment_name, 'wt') as f:
+            f.write(
+                '<?xml version="1.0" encoding="utf-8"?>\n<!DOCTYPE cesAlign '
+                'PUBLIC "-//CES//DTD XML cesAlign//EN" "">'
+                '\n<cesAlign version="1.0">\n')
+            for doc in ['', '2', '3']:
+                f.write(
+                    '<linkGrp fromDoc="test_files/test_en{0}" toDoc="test_'
+                    'files/test_fi{0}" >\n<link xtargets="s1;s1" id="SL1"/>\n'
+                    ' </linkGrp>\n'.format(doc))
+            f.write('</cesAlign>')
+        for lang in ['en', 'fi']:
+            with zipfile.ZipFile(os.path.join(self.tempdir1,
+                    'test_'+lang+'.zip'), 'w') as zf:
+                for doc in ['test_'+lang, 'test_'+lang+'2', 'test_'+lang+'3']:
+                    zf.writestr(os.path.join('test_files', doc),
+                        '<?xml version="1.0" encoding="utf-8"?>\n<text>\n'
+                        '<body>\n<s id="s1">\n <w>{0}1</w>\n</s>\n </body>\n'
+                        '</text>'.format(doc))
+
+        arguments = {'directory': 'Books', 'source': 'en', 'target': 'fi',
+            'alignment_file': alignment_name,
+            'source_zip': os.path.join(self.tempdir1, 'test_en.zip'),
+            'target_zip': os.path.join(self.tempdir1, 'test_fi.zip')}
+        for write_mode in ['normal', 'tmx', 'links']:
+            single = pairPrinterToVariable(write_mode=write_mode, **arguments)
+            shards = [pairPrinterToVariable(write_mode=write_mode,
+                shard_index=i, num_shards=2, **arguments) for i in range(2)]
+            self.assertEqual(''.join(shards), single)
+            self.assertNotIn('test_en3', shards[0])
+            self.assertNotIn('test_en1', shards[1])
+
+    def test_prefetch_sentence_files(self):
+        alignment_name = os.path.join(self.tempdir1, 'test_files',
+            'testlinks_prefetch.xml.gz')
+        with gzip.open(alignment_name, 'wt') as f:
+            f.write(
+                '<?xml version="1.0" encoding="utf-8"?>\n<!DOCTYPE cesAlign '
+                'PUBLIC "-//CES//DTD XML cesAlign//EN" "">'
+                '\n<cesAlign version="1.0">\n')
+            #The sentence files of test_en4 and test_fi4 are missing
+            for doc in ['', '4', '2', '3']:
+                f.write(
+                    '<linkGrp fromDoc="test_files/test_en{0}" toDoc="test_'
+                    'files/test_fi{0}" >\n<link xtargets="s1;s1" id="SL1"/>\n'
+                    ' </linkGrp>\n'.format(doc))
+            f.write('</cesAlign>')
+        for lang in ['en', 'fi']:
+            with zipfile.ZipFile(os.path.join(self.tempdir1,
+                    'test_prefetch_'+lang+'.zip'), 'w') as zf:
+                for doc in ['', '2', '3']:
+                    zf.writestr(os.path.join('test_files', 'test_'+lang+doc),
+                        '<?xml version="1.0" encoding="utf-8"?>\n<text>\n'
+                        '<body>\n<s id="s1">\n <w>{0}1</w>\n</s>\n </body>\n'
+                        '</text>'.format(lang+doc))
+
+        arguments = {'directory': 'Books', 'source': 'en', 'target': 'fi',
+            'alignment_file': alignment_name,
+            'source_zip': os.path.join(self.tempdir1, 'test_prefetch_en.zip'),
+            'target_zip': os.path.join(self.tempdir1, 'test_prefetch_fi.zip')}
+        for write_mode in ['normal', 'moses']:
+            expected = pairPrinterToVariable(write_mode=write_mode, **arguments)
+            for prefetch in [1, 3]:
+                self.assertEqual(pairPrinterToVariable(
+                    write_mode=write_mode, prefetch=prefetch, **arguments),
+                    expected)
+            self.assertIn("There is no item named 'test_files/test_en4'",
+                expected)
+            self.assertIn('en31', expected)
+
+    def test_write_compressed_files_in_threads(self):
+        with open(os.path.join(self.tempdir1, 'test_files', 'testlinks'),
+                'w') as f:
+            f.write(
+                '<?xml version="1.0" encoding="utf-8"?>\n<!DOCTYPE cesAlign '
+                'PUBLIC "-//CES//DTD XML cesAlign//EN" "">'
+                '\n<cesAlign version="1.0">\n<linkGrp fromDoc="test_files/'
+                'test_en" toDoc="test_files/test_fi" >\n<link xtargets='
+                '"s1;s1" id="SL1"/>\n<link xtargets="s2;s2" id="SL2"/>\n'
+                ' </linkGrp>\n</cesAlign>')
+        for lang in ['en', 'fi']:
+            with open(os.path.join(self.tempdir1, 'test_files',
+                    'test_'+lang), 'w') as f:
+                f.write(
+                    '<?xml version="1.0" encoding="utf-8"?>\n<text>\n'
+                    '<body>\n<s id="s1">\n <w>test_{0}1</w>\n <w>test_{0}2'
+                    '</w>\n</s>\n<s id="s2">\n <w>test_{0}3</w>\n</s>\n'
+                    ' </body>\n</text>'.format(lang))
+            with zipfile.ZipFile(os.path.join(self.tempdir1,
+                    'test_'+lang+'.zip'), 'w') as zf:
+                zf.write(os.path.join(self.tempdir1, 'test_files',
+                    'test_'+lang),
+                    arcname=os.path.join('test_files', 'test_'+lang))
+
+        src_name = os.path.join(self.tempdir1, 'test_files', 'moses.en.gz')
+        trg_name = os.path.join(self.tempdir1, 'test_files', 'moses.fi.bz2')
+        OpusRead(directory='Books', source='en', target='fi',
+            alignment_file=os.path.join(self.tempdir1, 'test_files',
+                'testlinks'),
+            source_zip = os.path.join(self.tempdir1, 'test_en.zip'),
+            target_zip = os.path.join(self.tempdir1, 'test_fi.zip'),
+            write_mode='moses', write=[src_name, trg_name],
+            compress_threads=2).printPairs()
+        with gzip.open(src_name, 'rt') as f:
+            self.assertEqual(f.read(), 'test_en1 test_en2\ntest_en3\n')
+        with bz2.open(trg_name, 'rt') as f:
+            self.assertEqual(f.read(), 'test_fi1 test_fi2\ntest_fi3\n')
+
     def test_try_to_open_wrongly_named_docs_from_specifed_source_zip(self):
         with open(os.path.join(self.tempdir1, 'test_files', 'testlinks'),
                 'w') as f:
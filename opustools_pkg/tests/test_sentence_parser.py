@@ -1,10 +1,15 @@
 import unittest
+from unittest import mock
 import tempfile
 import shutil
 import os
+import zipfile
 
 from opustools.parse.block_parser import BlockParser
 from opustools.parse.sentence_parser import SentenceParser
+from opustools.parse.sentence_index import SentenceIndex
+from opustools.parse.sentence_cache import (SentenceCache,
+        MemorySentenceCache)
 from opustools.util import file_open
 
 class TestSentenceParser(unittest.TestCase):
@@ -125,6 +130,109 @@ class TestSentenceParser(unittest.TestCase):
         sp.store_sentences({'1'})
         self.assertEqual(sp.sentences['1'][0], "- How'd you score that?")
 
+    def test_store_only_sentences_in_id_set(self):
+        sp = SentenceParser(file_open(self.os_path), preprocessing='xml',
+                preserve=True)
+        sp.store_sentences({'2'})
+        self.assertEqual(list(sp.sentences.keys()), ['2'])
+        self.assertEqual(sp.sentences['2'][0],
+                '- Mike the groundskeeper . <time id="T1E" '
+                'value="00:00:08,654" />')
+        sp = SentenceParser(file_open(self.books_raw_path),
+                preprocessing='raw')
+        sp.store_sentences(None)
+        self.assertEqual(list(sp.sentences.keys()), ['s1', 's2', 's3'])
+
+    def test_stream_sentences(self):
+        sp = SentenceParser(file_open(self.books_raw_path),
+                preprocessing='raw', chunk_size=200)
+        sp.stream_sentences({'s3': 1, 's1': 2})
+        self.assertEqual(sp.sentences, {})
+        self.assertEqual(sp.get_sentence('s3')[0], 'Victor Hugo')
+        self.assertEqual(list(sp.sentences.keys()), ['s1'])
+        self.assertEqual(sp.read_sentence(['s1', 's1'])[0],
+                ['Source: Project GutenbergTranslation: Isabel F. '
+                'HapgoodAudiobook available here']*2)
+        self.assertEqual(sp.sentences, {})
+        self.assertEqual(sp.get_sentence('s2'), ('', {}))
+        sp.close_document()
+
+    def test_read_sentences_with_index(self):
+        zip_path = os.path.join(self.tempdir, 'books.zip')
+        with zipfile.ZipFile(zip_path, 'w') as books_zip:
+            books_zip.write(self.os_path, 'os.xml')
+        with zipfile.ZipFile(zip_path) as books_zip:
+            for i in range(2):
+                index = SentenceIndex(books_zip)
+                sp = SentenceParser(index.open_sentences('os.xml', {'2'}),
+                        preprocessing='xml', preserve=True)
+                sp.store_sentences({'2'})
+                index.close()
+                self.assertEqual(list(sp.sentences.keys()), ['2'])
+                self.assertEqual(sp.sentences['2'][0],
+                        '- Mike the groundskeeper . <time id="T1E" '
+                        'value="00:00:08,654" />')
+        self.assertTrue(os.path.isfile(zip_path+'.sidx'))
+
+    def test_read_sentences_with_index_that_cannot_be_written(self):
+        zip_path = os.path.join(self.tempdir, 'books_ro.zip')
+        with zipfile.ZipFile(zip_path, 'w') as books_zip:
+            books_zip.write(self.os_path, 'os.xml')
+        with zipfile.ZipFile(zip_path) as books_zip:
+            index = SentenceIndex(books_zip, index_name=os.path.join(
+                self.tempdir, 'missing_dir', 'books.sidx'))
+            sp = SentenceParser(index.open_sentences('os.xml', {'2'}),
+                    preprocessing='xml', preserve=True)
+            sp.store_sentences({'2'})
+            self.assertTrue(index.is_indexed('os.xml'))
+            index.close()
+        self.assertEqual(list(sp.sentences.keys()), ['2'])
+
+    def test_store_sentences_with_cache(self):
+        cache = SentenceCache(os.path.join(self.tempdir, 'cache'))
+        sp = SentenceParser(file_open(self.books_raw_path),
+                preprocessing='raw', cache=cache, cache_key='books')
+        sp.store_sentences({'s3'})
+        self.assertEqual(list(sp.sentences.keys()), ['s1', 's2', 's3'])
+        self.assertEqual(len(os.listdir(cache.cache_dir)), 1)
+        sp = SentenceParser(file_open(self.books_raw_path),
+                preprocessing='raw', cache=cache, cache_key='books')
+        sp.store_sentences({'s3'})
+        self.assertEqual(sp.bp, None)
+        self.assertEqual(sp.get_sentence('s3')[0], 'Victor Hugo')
+        cache.max_size = 0
+        cache.evict()
+        self.assertEqual(os.listdir(cache.cache_dir), [])
+
+    def test_cache_size_is_kept_without_reading_the_directory(self):
+        cache = SentenceCache(os.path.join(self.tempdir, 'sized_cache'))
+        sentences = {'s1': ('Victor Hugo', {})}
+        with mock.patch.object(cache, 'evict', wraps=cache.evict) as evict:
+            for key in ['a', 'b', 'a']:
+                cache.save(key, sentences)
+            self.assertEqual(evict.call_count, 1)
+            self.assertEqual(cache.total_size, 2*os.path.getsize(
+                cache.get_path('a')))
+            cache.max_size = cache.total_size
+            os.utime(cache.get_path('b'), (0, 0))
+            cache.save('c', sentences)
+            self.assertEqual(evict.call_count, 2)
+        self.assertEqual(len(os.listdir(cache.cache_dir)), 2)
+        self.assertEqual(cache.load('b'), None)
+
+    def test_store_sentences_with_memory_cache(self):
+        cache = MemorySentenceCache(max_documents=1)
+        for key in ['books', 'books', 'os', 'books']:
+            sp = SentenceParser(file_open(self.books_raw_path),
+                    preprocessing='raw', cache=cache, cache_key=key)
+            sp.store_sentences({'s1'})
+            self.assertEqual(sp.get_sentence('s3')[0], 'Victor Hugo')
+        self.assertEqual((cache.hits, cache.misses), (1, 3))
+        self.assertEqual(len(cache.documents), 1)
+        cache = MemorySentenceCache(max_size=100)
+        cache.save('books', sp.sentences)
+        self.assertEqual(len(cache.documents), 0)
+
     def test_get_annotations(self):
         bp = BlockParser(file_open(self.books_path))
         sp = SentenceParser(file_open(self.books_path))